@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Benchmarks model evaluation, serialization and the HTTP request path for the models in examples/.
+
+Usage:
+    python benchmarks/run_benchmarks.py --output results.json
+    python benchmarks/run_benchmarks.py --output results.json --compare previous.json
+"""
+
+import os
+import sys
+import json
+import time
+import glob
+import argparse
+import platform
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import model_playground
+from flask import jsonify
+from model_playground.model import Model, IndependentVariableCollection, to_list
+from model_playground.routes import create_app, load_model, build_plot_data
+from model_playground.transport import to_json, to_binary
+
+DEFAULT_SIZES = [10 ** exponent for exponent in range(2, 7)]
+EXAMPLES_DIRECTORY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'examples')
+
+def summarize(timings: list):
+    """
+    Summarizes a list of timings (in seconds) as a latency distribution.
+    """
+
+    timings = np.asarray(timings)
+    return {
+        'n': len(timings),
+        'mean': float(timings.mean()),
+        'min': float(timings.min()),
+        'p50': float(np.percentile(timings, 50)),
+        'p90': float(np.percentile(timings, 90)),
+        'p99': float(np.percentile(timings, 99)),
+    }
+
+def time_calls(function, repeats: int):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+def resize_model(model: Model, size: int):
+    """
+    Builds a copy of a model with one independent variable, evaluated over size points spanning the same range.
+    """
+
+    names = model.independent_variable_collection.get_names()
+    value_array = model.independent_variable_collection.get_value_arrays(aslist=False)[0]
+    independent_variable_collection = IndependentVariableCollection(names=names, value_arrays=[np.linspace(value_array.min(), value_array.max(), size)])
+
+    return Model(
+        model=model.model,
+        name=model.name,
+        independent_variable_collection=independent_variable_collection,
+        parameter_collection=model.parameter_collection,
+        prediction_names=model.prediction_names,
+        prediction_units=model.prediction_units
+    )
+
+def random_parameters(model: Model, rng: np.random.Generator):
+    """
+    Draws parameter values uniformly within the slider ranges, around the initial values.
+    """
+
+    parameters = {}
+    for slider_data in model.slider_data:
+        parameters[slider_data['name']] = float(np.clip(slider_data['initial_value'] + rng.uniform(-5, 5) * slider_data['stepsize'], slider_data['min'], slider_data['max']))
+    return parameters
+
+def benchmark_model(model: Model, repeats: int, requests: int, rng: np.random.Generator):
+    """
+    Benchmarks evaluation, serialization and the HTTP request path for a model.
+    """
+
+    results = {}
+    parameter_sets = [random_parameters(model, rng) for _ in range(max(repeats, requests))]
+
+    # model evaluation
+    iterator = iter(parameter_sets)
+    results['evaluate'] = summarize(time_calls(lambda: model.evaluate(aslist=False, parameters=next(iterator)), repeats))
+
+    # serialization of model outputs
+    app = create_app(model=model)
+    output = model.evaluate(aslist=False)
+    plot_data = build_plot_data(model, output)
+    results['to_list'] = summarize(time_calls(lambda: to_list(output), repeats))
+    with app.app_context():
+        results['jsonify'] = summarize(time_calls(lambda: jsonify(to_json(plot_data)), repeats))
+    results['to_binary'] = summarize(time_calls(lambda: to_binary(plot_data, dtype='float32'), repeats))
+
+    # end-to-end request throughput
+    client = app.test_client()
+    client.get('/serve_plot_data')
+    for route, build_request in [
+        ('/update_plot_data', lambda parameters: {'paramName': next(iter(parameters)), 'paramValue': next(iter(parameters.values()))}),
+        ('/update_parameters', lambda parameters: {'parameters': parameters, 'format': 'binary', 'dtype': 'float32'}),
+    ]:
+        bodies = [build_request(parameters) for parameters in parameter_sets[:requests]]
+        start = time.perf_counter()
+        for body in bodies:
+            response = client.post(route, json=body)
+            assert response.status_code == 200, f'Benchmark Error: {route} returned {response.status_code}.'
+        elapsed = time.perf_counter() - start
+        results[route] = {'requests': requests, 'seconds': elapsed, 'requests_per_second': requests / elapsed}
+
+    return results
+
+def compare(results: dict, previous: dict, tolerance: float):
+    """
+    Compares median latencies against previous results. Returns a list of regressions.
+    """
+
+    previous_runs = dict([((run['model'], run['size']), run) for run in previous['runs']])
+    regressions = []
+    for run in results['runs']:
+        previous_run = previous_runs.get((run['model'], run['size']))
+        if not previous_run or 'results' not in run or 'results' not in previous_run:
+            continue
+        for name, result in run['results'].items():
+            previous_result = previous_run['results'].get(name, {})
+            if 'p50' in result and 'p50' in previous_result and result['p50'] > previous_result['p50'] * (1 + tolerance):
+                regressions.append(f"{run['model']} (n={run['size']}) {name}: p50 {previous_result['p50']:.3g}s -> {result['p50']:.3g}s")
+            if 'requests_per_second' in result and 'requests_per_second' in previous_result and result['requests_per_second'] < previous_result['requests_per_second'] / (1 + tolerance):
+                regressions.append(f"{run['model']} (n={run['size']}) {name}: {previous_result['requests_per_second']:.3g} -> {result['requests_per_second']:.3g} requests/s")
+    return regressions
+
+def main():
+
+    # construct parser
+    parser = argparse.ArgumentParser(description='Benchmarks modelPlayground models and routes.')
+    parser.add_argument('--output', type=str, help='Path to the JSON results file.', required=True)
+    parser.add_argument('--model-files', type=str, nargs='+', default=sorted(glob.glob(os.path.join(EXAMPLES_DIRECTORY, '*.py'))), help='Model files to benchmark. Defaults to the examples.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='Numbers of independent variable points.')
+    parser.add_argument('--repeats', type=int, default=50, help='Number of timed calls per measurement.')
+    parser.add_argument('--requests', type=int, default=50, help='Number of requests per route.')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for drawing parameter values.')
+    parser.add_argument('--compare', type=str, default=None, help='Path to previous results to check for regressions.')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Relative slowdown tolerated when comparing results.')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    results = {
+        'version': model_playground.__version__,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'runs': [],
+    }
+
+    for model_file in args.model_files:
+        model_name = os.path.splitext(os.path.basename(model_file))[0]
+
+        # models that fail to load (e.g. because of missing dependencies) are recorded and skipped
+        try:
+            model = load_model(model_file)
+        except (Exception, SystemExit) as error:
+            print(f'Skipping {model_name}: {error!r}')
+            results['runs'].append({'model': model_name, 'size': None, 'error': repr(error)})
+            continue
+
+        if len(model.independent_variable_collection.get_names()) != 1:
+            print(f'Skipping {model_name}: only models with one independent variable are resized.')
+            continue
+
+        for size in args.sizes:
+            print(f'Benchmarking {model_name} with {size} points')
+            run = {'model': model_name, 'size': size}
+            try:
+                run['results'] = benchmark_model(resize_model(model, size), args.repeats, args.requests, rng)
+            except Exception as error:
+                run['error'] = repr(error)
+            results['runs'].append(run)
+
+    with open(args.output, 'w') as file:
+        json.dump(results, file, indent=2)
+    print(f'Wrote results to {args.output}')
+
+    if args.compare:
+        with open(args.compare, 'r') as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+        for regression in regressions:
+            print(f'REGRESSION: {regression}')
+        if regressions:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
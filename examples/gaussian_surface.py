@@ -0,0 +1,25 @@
+from model_playground.model import Model, IndependentVariableCollection, ParameterCollection
+import numpy as np
+
+# define the model
+# NOTE: with two independent variables, x is passed as a row (shape (1, Nx)) and y as a column (shape (Ny, 1)),
+# so the model is evaluated over the whole grid by broadcasting
+def gaussian_surface(x: np.ndarray, y: np.ndarray, amplitude, x0, y0, width):
+    return amplitude * np.exp(-((x - x0) ** 2 + (y - y0) ** 2) / (2 * width ** 2))
+
+# define the independent variable collection
+# NOTE: ensure that the variable names are consistent with the function signature
+independent_variable_collection = IndependentVariableCollection(names=['x', 'y'], value_arrays=[np.linspace(-5, 5, 500), np.linspace(-5, 5, 500)])
+
+# define the free parameter variable collection
+# NOTE: ensure that parameter names are consistent with the function signature
+parameter_collection = ParameterCollection(names=['amplitude', 'x0', 'y0', 'width'], initial_values=[1, 0, 0, 1], lower_bounds=[0, -5, -5, 0.1], upper_bounds=[2, 5, 5, 5])
+
+# construct the model
+model = Model(
+    model=gaussian_surface,
+    name='Gaussian Surface',
+    independent_variable_collection=independent_variable_collection,
+    parameter_collection=parameter_collection,
+    cache_size=64
+    )
@@ -0,0 +1,36 @@
+from model_playground.model import MassActionModel, IndependentVariableCollection, ParameterCollection
+import numpy as np
+
+# define the independent variable collection
+# NOTE: mass action models have a single independent variable (time)
+independent_variable_collection = IndependentVariableCollection(names=['time'], value_arrays=[np.linspace(0, 1000, 1000)])
+
+# define the free parameter variable collection
+# NOTE: rate constants and initial concentrations may be parameters
+# NOTE: uncertain rate constants are shown as bands around predictions
+parameter_collection = ParameterCollection(
+    names=['E', 'S', 'kon', 'koff', 'kcat'], 
+    initial_values=[1e-1, 1e3, 100, 1, 1], 
+    lower_bounds=[0, 0, 0, 0, 0], 
+    upper_bounds=[1e1, 1e4, 1e10, 1e10, 1000],
+    uncertainties=[None, None, ('lognormal', 0.2), ('lognormal', 0.2), ('lognormal', 0.2)])
+
+# construct the model from the mass action matrices of E + S <-> ES -> E + P
+# NOTE: columns of the matrices follow the order of species, and rows the order of rate constants
+model = MassActionModel(
+    name='Michaelis Menten Model of Enzyme Kinetics (Mass Action)',
+    species=['E', 'P', 'ES', 'S'],
+    reactant_matrix=[
+        [1, 0, 0, 1],
+        [0, 0, 1, 0],
+        [0, 0, 1, 0]],
+    stoichiometry_matrix=[
+        [-1, 0, 1, -1],
+        [1, 0, -1, 1],
+        [1, 1, -1, 0]],
+    rate_constants=['kon', 'koff', 'kcat'],
+    initial_conditions=['E', 0, 0, 'S'],
+    independent_variable_collection=independent_variable_collection,
+    parameter_collection=parameter_collection,
+    cache_size=256
+    )
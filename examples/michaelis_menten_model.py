@@ -49,9 +49,11 @@ parameter_collection = ParameterCollection(
     upper_bounds=[1e1, 1e4, 1e10, 1e10, 1000])
 
 # construct the model
+# NOTE: each evaluation integrates the ODEs, so recent outputs are memoized
 model = Model(
     model=MM_model, 
     name='Michaelis Menten Model of Enzyme Kinetics',
     independent_variable_collection=independent_variable_collection, 
-    parameter_collection=parameter_collection
+    parameter_collection=parameter_collection,
+    cache_size=256
     )
\ No newline at end of file
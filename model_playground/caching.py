@@ -0,0 +1,98 @@
+import os
+import gzip
+import hashlib
+import threading
+from flask import Response, request, current_app
+from .transport import BINARY_MIMETYPE
+
+# brotli is optional: without it, responses are only compressed with gzip
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+STATIC_MAX_AGE = 365 * 24 * 3600 # seconds that versioned static assets are cached for
+COMPRESSION_THRESHOLD = 1024 # bytes below which responses are sent uncompressed
+COMPRESSIBLE_MIMETYPES = ('application/json', BINARY_MIMETYPE)
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 4
+
+# content hashes of static files, keyed by path, along with the modification time they were computed for
+_static_hashes = {}
+_static_hashes_lock = threading.Lock()
+
+def static_file_hash(path: str):
+    """
+    Returns a short hash of the contents of a static file, recomputed only when the file is modified.
+    Returns None if the file does not exist.
+    """
+
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    with _static_hashes_lock:
+        cached = _static_hashes.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+
+    with open(path, 'rb') as file:
+        digest = hashlib.sha256(file.read()).hexdigest()[:12]
+    with _static_hashes_lock:
+        _static_hashes[path] = (mtime, digest)
+    return digest
+
+def add_static_version(endpoint: str, values: dict):
+    """
+    URL defaults callback adding the content hash of static files to their URLs (as ?v=<hash>), so that URLs change
+    whenever files do, and assets can be cached indefinitely.
+    """
+
+    if endpoint == 'static' and 'filename' in values and 'v' not in values:
+        digest = static_file_hash(os.path.join(current_app.static_folder, values['filename']))
+        if digest:
+            values['v'] = digest
+
+def add_static_cache_headers(response: Response):
+    """
+    Marks static assets requested by their current content hash as immutable. Other static requests keep
+    revalidating with the server.
+    """
+
+    if request.endpoint == 'static' and response.status_code == 200 and request.args.get('v'):
+        digest = static_file_hash(os.path.join(current_app.static_folder, request.view_args.get('filename', '')))
+        if digest == request.args['v']:
+            response.headers['Cache-Control'] = f'public, max-age={STATIC_MAX_AGE}, immutable'
+    return response
+
+def make_conditional_response(response: Response):
+    """
+    Tags a response with an ETag of its body, and replaces it with a 304 Not Modified response if the client
+    already holds it. Clients revalidate on every use, since bodies depend on the state of their session. ETags
+    are weak, so they match across compressed encodings of the same body.
+    """
+
+    response.add_etag(weak=True)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
+
+def compress_response(response: Response):
+    """
+    Compresses JSON and binary payload responses above COMPRESSION_THRESHOLD bytes with the best encoding accepted
+    by the client: brotli if installed, then gzip. Streamed responses are sent as they are.
+    """
+
+    response.vary.add('Accept-Encoding')
+    if response.status_code != 200 or response.is_streamed or response.direct_passthrough or 'Content-Encoding' in response.headers:
+        return response
+    if response.mimetype not in COMPRESSIBLE_MIMETYPES or 'Accept-Encoding' not in request.headers:
+        return response
+
+    encoding = request.accept_encodings.best_match(['br', 'gzip'] if brotli else ['gzip'])
+    data = response.get_data()
+    if encoding is None or len(data) < COMPRESSION_THRESHOLD:
+        return response
+
+    response.set_data(brotli.compress(data, quality=BROTLI_QUALITY) if encoding == 'br' else gzip.compress(data, compresslevel=GZIP_LEVEL))
+    response.headers['Content-Encoding'] = encoding
+    return response
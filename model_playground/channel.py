@@ -0,0 +1,46 @@
+import threading
+
+class UpdateChannel:
+    def __init__(self):
+        """
+        A latest-wins mailbox for updates (parameter vectors and view settings) streamed from a client.
+        Pending updates are coalesced, so that only the newest parameter vector is evaluated, and updates
+        that arrive out of order are dropped.
+        """
+
+        self.closed = False
+        self.last_sequence = 0
+        self._pending = None
+        self._condition = threading.Condition()
+
+    def submit(self, sequence: int, update: dict):
+        """
+        Posts an update to the channel, replacing any pending update with a lower sequence number.
+        Returns whether the update was accepted.
+        """
+
+        with self._condition:
+            if sequence <= self.last_sequence or (self._pending and sequence <= self._pending[0]):
+                return False
+            self._pending = (sequence, update)
+            self._condition.notify()
+            return True
+
+    def take(self, timeout: float = None):
+        """
+        Blocks until an update is pending, then returns it as a (sequence, update) tuple.
+        Returns None if the timeout expires or the channel is closed.
+        """
+
+        with self._condition:
+            self._condition.wait_for(lambda: self._pending is not None or self.closed, timeout=timeout)
+            if self.closed or self._pending is None:
+                return None
+            pending, self._pending = self._pending, None
+            self.last_sequence = pending[0]
+            return pending
+
+    def close(self):
+        with self._condition:
+            self.closed = True
+            self._condition.notify_all()
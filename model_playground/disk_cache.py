@@ -0,0 +1,156 @@
+import os
+import time
+import sqlite3
+import tempfile
+import threading
+import numpy as np
+from contextlib import contextmanager
+
+INDEX_FILE = 'index.sqlite'
+BLOB_DIRECTORY = 'blobs'
+SQLITE_TIMEOUT = 30 # seconds to wait for other processes writing to the index
+EVICTION_BATCH = 64 # entries removed per query while evicting
+
+class DiskCache:
+    def __init__(self, directory: str, max_bytes: int = None):
+        """
+        A persistent cache of model outputs, shared by every process that opens the same directory. Outputs are
+        stored as .npy blobs named by their (content-addressed) keys, and read back memory-mapped. An SQLite index
+        in WAL mode records the size and last access of each blob, so that the least-recently-used blobs are evicted
+        once the cache exceeds max_bytes.
+
+        Blobs are written to temporary files and renamed into place, so readers in other processes never see
+        partially written outputs. Evicted blobs that are still mapped by a reader remain readable until unmapped.
+
+        Parameters:
+            directory (str): Directory holding the index and blobs. Created if it does not exist.
+            max_bytes (int): Maximum total size of blobs. Unbounded if None.
+        """
+
+        assert max_bytes is None or max_bytes > 0, 'DiskCache Error: max_bytes must be a positive integer.'
+
+        self.directory = os.path.abspath(directory)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(os.path.join(self.directory, BLOB_DIRECTORY), exist_ok=True)
+
+        # SQLite connections cannot be shared across threads or forked processes
+        self._local = threading.local()
+        with self._transaction() as connection:
+            connection.execute('CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, nbytes INTEGER NOT NULL, last_access REAL NOT NULL)')
+            connection.execute('CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)')
+
+    def _connect(self):
+        if getattr(self._local, 'pid', None) != os.getpid():
+            connection = sqlite3.connect(os.path.join(self.directory, INDEX_FILE), timeout=SQLITE_TIMEOUT, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection, self._local.pid = connection, os.getpid()
+        return self._local.connection
+
+    @contextmanager
+    def _transaction(self):
+        """
+        Runs queries in a transaction that holds the write lock of the index from the start, so that concurrent
+        writers are serialized rather than failing to upgrade their locks.
+        """
+
+        connection = self._connect()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield connection
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+
+    def _blob_path(self, key: str):
+        return os.path.join(self.directory, BLOB_DIRECTORY, key[:2], f'{key}.npy')
+
+    def contains(self, key: str):
+        return os.path.exists(self._blob_path(key))
+
+    def get(self, key: str):
+        """
+        Returns the read-only, memory-mapped output stored under key, or None.
+        """
+
+        try:
+            value = np.load(self._blob_path(key), mmap_mode='r', allow_pickle=False)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+
+        # recording accesses is best effort: a busy index must not delay reads
+        try:
+            connection = self._connect()
+            connection.execute('UPDATE entries SET last_access = ? WHERE key = ?', (time.time(), key))
+        except sqlite3.OperationalError:
+            pass
+        return np.asarray(value)
+
+    def put(self, key: str, value: np.ndarray):
+        value = np.asarray(value)
+
+        # entries larger than the whole budget, or that cannot be stored without pickling, are never stored
+        if value.dtype.hasobject or (self.max_bytes is not None and value.nbytes > self.max_bytes):
+            return
+
+        path = self._blob_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        descriptor, temporary_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(descriptor, 'wb') as file:
+                np.save(file, value, allow_pickle=False)
+            os.replace(temporary_path, path)
+        except BaseException:
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+            raise
+
+        with self._transaction() as connection:
+            connection.execute('INSERT OR REPLACE INTO entries (key, nbytes, last_access) VALUES (?, ?, ?)', (key, os.path.getsize(path), time.time()))
+            if self.max_bytes is not None:
+                self._evict(connection)
+
+    def _evict(self, connection: sqlite3.Connection):
+        """
+        Private method for removing least-recently-used entries until the cache fits within max_bytes.
+        """
+
+        nbytes = connection.execute('SELECT COALESCE(SUM(nbytes), 0) FROM entries').fetchone()[0]
+        while nbytes > self.max_bytes:
+            evicted = connection.execute('SELECT key, nbytes FROM entries ORDER BY last_access LIMIT ?', (EVICTION_BATCH,)).fetchall()
+            if not evicted:
+                break
+            for key, entry_nbytes in evicted:
+                connection.execute('DELETE FROM entries WHERE key = ?', (key,))
+                try:
+                    os.remove(self._blob_path(key))
+                except OSError:
+                    pass
+                nbytes -= entry_nbytes
+                if nbytes <= self.max_bytes:
+                    break
+
+    def clear(self):
+        with self._transaction() as connection:
+            for key, in connection.execute('SELECT key FROM entries').fetchall():
+                try:
+                    os.remove(self._blob_path(key))
+                except OSError:
+                    pass
+            connection.execute('DELETE FROM entries')
+
+    def get_info(self):
+        entries, nbytes = self._connect().execute('SELECT COUNT(*), COALESCE(SUM(nbytes), 0) FROM entries').fetchone()
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'entries': entries,
+            'nbytes': nbytes,
+            'max_bytes': self.max_bytes,
+            'directory': self.directory
+        }
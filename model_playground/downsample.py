@@ -0,0 +1,82 @@
+import numpy as np
+
+def lttb(x: np.ndarray, y: np.ndarray, max_points: int):
+    """
+    Largest-Triangle-Three-Buckets downsampling. Returns the indices of at most max_points points
+    that preserve the visual shape of the trace.
+    """
+
+    no_points = len(y)
+    if no_points <= max_points or max_points < 3:
+        return np.arange(no_points)
+
+    # the first and last points are always kept, interior points are split into max_points - 2 buckets
+    edges = np.linspace(1, no_points - 1, max_points - 1).astype(int)
+    indices = np.empty(max_points, dtype=int)
+    indices[0], indices[-1] = 0, no_points - 1
+
+    selected = 0
+    for bucket in range(max_points - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        next_start, next_end = (edges[bucket + 1], edges[bucket + 2]) if bucket + 2 < len(edges) else (no_points - 1, no_points)
+
+        # pick the point forming the largest triangle with the last selected point and the average of the next bucket
+        x_average, y_average = x[next_start:next_end].mean(), y[next_start:next_end].mean()
+        areas = np.abs((x[selected] - x_average) * (y[start:end] - y[selected]) - (x[selected] - x[start:end]) * (y_average - y[selected]))
+        selected = start + int(np.argmax(areas))
+        indices[bucket + 1] = selected
+
+    return indices
+
+def minmax(x: np.ndarray, y: np.ndarray, max_points: int):
+    """
+    Min-max downsampling. Returns the indices of the minimum and maximum of max_points / 2 equally
+    sized buckets, along with the first and last points.
+    """
+
+    no_points, no_buckets = len(y), max_points // 2
+    if no_points <= max_points or no_buckets < 1:
+        return np.arange(no_points)
+
+    # pad the trace so that buckets can be reduced along one axis
+    bucket_size = -(-no_points // no_buckets)
+    offsets = np.arange(no_buckets) * bucket_size
+    padded = np.empty(no_buckets * bucket_size, dtype=float)
+    padded[:no_points] = y
+
+    padded[no_points:] = np.inf
+    minima = offsets + np.argmin(padded.reshape(no_buckets, bucket_size), axis=1)
+    padded[no_points:] = -np.inf
+    maxima = offsets + np.argmax(padded.reshape(no_buckets, bucket_size), axis=1)
+
+    indices = np.unique(np.concatenate([[0, no_points - 1], minima, maxima]))
+    return indices[indices < no_points]
+
+DOWNSAMPLING_METHODS = {'lttb': lttb, 'minmax': minmax}
+
+def reduce_trace(x: np.ndarray, y: np.ndarray, max_points: int = None, x_range: list = None, method: str = 'lttb'):
+    """
+    Restricts a trace to the points visible within x_range and downsamples them to at most max_points.
+    The points just outside x_range are kept, so that lines extend to the edges of the plot. x is assumed
+    to be sorted. Returns the reduced x and y arrays.
+
+    Parameters:
+        x (np.ndarray): Values of the independent variable.
+        y (np.ndarray): Values of the model prediction.
+        max_points (int): Target number of points, e.g. the pixel width of the plot. If None, points are not downsampled.
+        x_range (list): Visible [min, max] range of the independent variable. If None, the whole trace is visible.
+        method (str): Downsampling method, either lttb or minmax.
+    """
+
+    assert method in DOWNSAMPLING_METHODS, f'Downsampling Error: method must be one of {tuple(DOWNSAMPLING_METHODS)}.'
+
+    if x_range is not None:
+        visible = np.flatnonzero((x >= x_range[0]) & (x <= x_range[1]))
+        start, end = (max(visible[0] - 1, 0), min(visible[-1] + 2, len(x))) if len(visible) > 0 else (0, 0)
+        x, y = x[start:end], y[start:end]
+
+    if max_points is not None and len(y) > max_points:
+        indices = DOWNSAMPLING_METHODS[method](x, y, max_points)
+        x, y = x[indices], y[indices]
+
+    return x, y
@@ -0,0 +1,267 @@
+import io
+import csv
+import json
+import numpy as np
+from concurrent.futures import FIRST_COMPLETED, wait
+from .model import Model
+from .pool import get_worker_model
+
+DIFFERENCE_STEP = 1e-6 # relative step of forward differences
+DAMPING_FACTORS = (0.1, 1.0, 10.0) # damping trials evaluated together in each iteration
+INITIAL_DAMPING = 1e-3
+MAX_DAMPING = 1e10 # fits stop once no damped step reduces the cost
+
+class FitData:
+    def __init__(self, x: np.ndarray, y: np.ndarray, prediction_indices: list = None):
+        """
+        Measurements to fit a model to: values of the independent variable, and a row of measured values per
+        fitted prediction. Missing measurements are NaN.
+
+        Parameters:
+            x (np.ndarray): Values of the independent variable, with shape (number of points,).
+            y (np.ndarray): Measured values, with shape (number of points,) or (number of fitted predictions, number of points).
+            prediction_indices (list): Indices of the predictions measured by the rows of y. Defaults to the first predictions.
+        """
+
+        x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+        y = y if y.ndim == 2 else y.reshape(1, -1)
+        prediction_indices = list(range(len(y))) if prediction_indices is None else [int(index) for index in prediction_indices]
+
+        assert x.ndim == 1 and len(x) > 0, 'Fitting Error: x must be a non-empty one dimensional array.'
+        assert y.shape[1] == len(x), 'Fitting Error: rows of y must have one value per x value.'
+        assert len(prediction_indices) == len(y), 'Fitting Error: prediction_indices must have one index per row of y.'
+        assert np.all(np.isfinite(x)), 'Fitting Error: x values must be finite.'
+
+        self.x = x
+        self.y = y
+        self.prediction_indices = prediction_indices
+        self.mask = np.isfinite(y)
+        assert self.mask.any(), 'Fitting Error: at least one measured value is required.'
+
+    def to_dict(self):
+        """
+        Returns the measurements in a JSON serializable form, where missing measurements are None (null in JSON,
+        which FitData reads back as NaN) rather than NaN, which is not valid JSON.
+        """
+
+        return {'x': self.x.tolist(), 'y': np.where(self.mask, self.y, None).tolist(), 'predictions': self.prediction_indices}
+
+def _prediction_index(model: Model, column: str, position: int):
+    if column in model.prediction_names:
+        return list(model.prediction_names).index(column)
+    try:
+        return int(column)
+    except (TypeError, ValueError):
+        return position
+
+def read_data(text: str, model: Model, format: str = 'csv'):
+    """
+    Reads measurements for a model from CSV or JSON text. CSV columns hold x values, then measured values of
+    predictions, which are matched by name (or index) if the file has a header, and taken in order otherwise.
+    JSON has the form {'x': [...], 'y': [...] or [[...], ...], 'predictions': [names or indices]}. Returns a FitData.
+    """
+
+    if format == 'json':
+        data = json.loads(text)
+        y = np.asarray(data['y'], dtype=float)
+        columns = data.get('predictions', list(range(len(y) if y.ndim == 2 else 1)))
+        return FitData(data['x'], y, [_prediction_index(model, column, position) for position, column in enumerate(columns)])
+
+    assert format == 'csv', 'Fitting Error: format must be csv or json.'
+    rows = [row for row in csv.reader(io.StringIO(text)) if row and any(cell.strip() for cell in row)]
+    assert len(rows) > 0, 'Fitting Error: no data found.'
+
+    # a first row that is not numeric is a header naming the measured predictions
+    try:
+        [float(cell) for cell in rows[0] if cell.strip()]
+        header = None
+    except ValueError:
+        header, rows = rows[0], rows[1:]
+
+    values = np.array([[float(cell) if cell.strip() else np.nan for cell in row] for row in rows], dtype=float)
+    assert values.ndim == 2 and values.shape[1] > 1, 'Fitting Error: CSV data requires an x column and at least one column of measurements.'
+    columns = [column.strip() for column in header[1:]] if header else list(range(values.shape[1] - 1))
+    return FitData(values[:, 0], values[:, 1:].T, [_prediction_index(model, column, position) for position, column in enumerate(columns)])
+
+def _interpolate(x_model: np.ndarray, values: np.ndarray, x: np.ndarray):
+    """
+    Linearly interpolates values along their last axis, from x_model onto x, as np.interp does for one dimensional values.
+    """
+
+    index = np.clip(np.searchsorted(x_model, x), 1, len(x_model) - 1)
+    weight = np.clip((x - x_model[index - 1]) / (x_model[index] - x_model[index - 1]), 0, 1)
+    return values[..., index - 1] * (1 - weight) + values[..., index] * weight
+
+def compute_residuals(model: Model, data: FitData, param_matrix: np.ndarray):
+    """
+    Computes residuals of model predictions against measured values, for every row of param_matrix at once.
+    Returns an np.ndarray with shape (N, number of measured values).
+    """
+
+    x_model = model.independent_variable_collection.get_value_arrays(aslist=False)[0]
+    with np.errstate(all='ignore'):
+        output = model.evaluate_batch(param_matrix)[:, data.prediction_indices]
+        return (_interpolate(x_model, output, data.x) - data.y)[:, data.mask]
+
+def _cost(residuals: np.ndarray):
+    cost = 0.5 * np.sum(np.square(residuals), axis=-1)
+    return np.where(np.isfinite(cost), cost, np.inf)
+
+def fit_iterations(model: Model, data: FitData, state: dict, iterations: int, tolerance: float = 1e-8):
+    """
+    Runs iterations of a Levenberg-Marquardt fit, projected onto the parameter bounds, and returns the updated
+    fit state. Each iteration evaluates the model twice with evaluate_batch: once for the current parameters
+    and their forward difference perturbations, and once for a trial step of each damping factor.
+    """
+
+    state = dict(state)
+    parameters, damping = np.array(state['parameters'], dtype=float), state['damping']
+    lower_bounds = np.array(model.parameter_collection.get_lower_bounds(), dtype=float)
+    upper_bounds = np.array(model.parameter_collection.get_upper_bounds(), dtype=float)
+
+    for _ in range(iterations):
+        if state['converged']:
+            break
+
+        # forward differences, relative to parameter values, stepping backwards from upper bounds
+        steps = DIFFERENCE_STEP * np.where(parameters != 0, np.abs(parameters), np.maximum(upper_bounds - lower_bounds, 1))
+        steps = np.where(parameters + steps > upper_bounds, -steps, steps)
+        residuals = compute_residuals(model, data, np.vstack([parameters, parameters + np.diag(steps)]))
+        cost = float(_cost(residuals[0]))
+        jacobian = ((residuals[1:] - residuals[0]) / steps[:, np.newaxis]).T
+        if cost == 0 or not np.isfinite(cost) or not np.all(np.isfinite(jacobian)):
+            state['converged'], state['cost'] = True, cost
+            break
+
+        # damped Gauss-Newton steps, scaled by the curvature of each parameter
+        gradient, curvature = jacobian.T @ residuals[0], jacobian.T @ jacobian
+        scaling = np.diag(curvature) + np.finfo(float).eps
+        candidates = []
+        for factor in DAMPING_FACTORS:
+            step = np.linalg.lstsq(curvature + damping * factor * np.diag(scaling), -gradient, rcond=None)[0]
+            candidates.append(np.clip(parameters + step, lower_bounds, upper_bounds))
+        candidate_costs = _cost(compute_residuals(model, data, np.array(candidates)))
+
+        best = int(np.argmin(candidate_costs))
+        state['iterations'] += 1
+        if candidate_costs[best] < cost:
+            parameters, state['cost'] = candidates[best], float(candidate_costs[best])
+            damping = max(damping * DAMPING_FACTORS[best] / 3, np.finfo(float).eps)
+            state['converged'] = cost - candidate_costs[best] <= tolerance * cost
+        else:
+            state['cost'] = cost
+            damping *= 100
+            state['converged'] = damping > MAX_DAMPING
+
+    state['parameters'], state['damping'] = parameters, damping
+    return state
+
+def _fit_model_file_iterations(model_file: str, data: FitData, state: dict, iterations: int, tolerance: float):
+    return fit_iterations(get_worker_model(model_file), data, state, iterations, tolerance)
+
+def latin_hypercube(no_samples: int, no_dimensions: int, rng: np.random.Generator):
+    """
+    Draws samples spread evenly over the unit hypercube: each dimension has exactly one sample per 1 / no_samples interval.
+    """
+
+    samples = (np.arange(no_samples)[:, np.newaxis] + rng.random((no_samples, no_dimensions))) / max(no_samples, 1)
+    for dimension in range(no_dimensions):
+        samples[:, dimension] = rng.permutation(samples[:, dimension])
+    return samples
+
+def fit_model(
+        model: Model,
+        data: FitData,
+        starts: int = 8,
+        max_iterations: int = 100,
+        tolerance: float = 1e-8,
+        seed: int = 0,
+        initial_parameters: dict = None,
+        executor = None,
+        model_file: str = None,
+        progress = None,
+        report_every: int = 5,
+        stop = None):
+    """
+    Fits model parameters to measured data, minimizing the sum of squared residuals within the bounds of the
+    parameter collection. Fits start from the initial parameters and from starts - 1 points spread over the
+    bounds, and run in batches of report_every iterations. Batches of different starts run concurrently in an
+    executor: process pools read the model from model_file, thread pools share the model. Without an executor,
+    starts run in turn on the calling thread.
+
+    Parameters:
+        progress (Callable): Called with the best result so far after every batch.
+        stop (threading.Event): Stops the fit early when set.
+
+    Returns a result of the form {'parameters', 'cost', 'iterations', 'converged', 'starts'}, where the cost
+    is None if no start evaluated to finite residuals.
+    """
+
+    assert len(model.independent_variable_collection.get_names()) == 1, 'Fitting Error: only models of one independent variable can be fitted.'
+    x_model = model.independent_variable_collection.get_value_arrays(aslist=False)[0]
+    assert np.all(np.diff(x_model) > 0), 'Fitting Error: independent variable values must be increasing.'
+    assert max(data.prediction_indices) < len(model.evaluate(aslist=False)) and min(data.prediction_indices) >= 0, 'Fitting Error: measured predictions do not exist.'
+    assert starts > 0 and max_iterations > 0 and report_every > 0, 'Fitting Error: starts, max_iterations and report_every must be positive.'
+
+    names = model.parameter_collection.get_names()
+    lower_bounds = np.array(model.parameter_collection.get_lower_bounds(), dtype=float)
+    upper_bounds = np.array(model.parameter_collection.get_upper_bounds(), dtype=float)
+    initial_parameters = dict(model.get_parameters(), **(initial_parameters or {}))
+
+    start_points = [np.clip([float(initial_parameters[name]) for name in names], lower_bounds, upper_bounds)]
+    start_points += list(lower_bounds + (upper_bounds - lower_bounds) * latin_hypercube(starts - 1, len(names), np.random.default_rng(seed)))
+    states = [{'start': index, 'parameters': point, 'damping': INITIAL_DAMPING, 'cost': np.inf, 'iterations': 0, 'converged': False} for index, point in enumerate(start_points)]
+
+    best = None
+    def report(state):
+        nonlocal best
+        if best is None or state['cost'] < best['cost'] or state['start'] == best['start']:
+            best = state
+        if progress:
+            progress(_fit_result(names, best, states))
+
+    def is_done(state):
+        return state['converged'] or state['iterations'] >= max_iterations or (stop is not None and stop.is_set())
+
+    if executor is None:
+        pending = list(range(len(states)))
+        while pending:
+            index = pending.pop(0)
+            states[index] = fit_iterations(model, data, states[index], min(report_every, max_iterations - states[index]['iterations']), tolerance)
+            report(states[index])
+            if not is_done(states[index]):
+                pending.append(index)
+        return _fit_result(names, best, states)
+
+    def submit(state):
+        iterations = min(report_every, max_iterations - state['iterations'])
+        if model_file:
+            return executor.submit(_fit_model_file_iterations, model_file, data, state, iterations, tolerance)
+        return executor.submit(fit_iterations, model, data, state, iterations, tolerance)
+
+    futures = dict([(submit(state), state['start']) for state in states])
+    try:
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = futures.pop(future)
+                states[index] = future.result()
+                report(states[index])
+                if not is_done(states[index]):
+                    futures[submit(states[index])] = index
+    finally:
+        for future in futures:
+            future.cancel()
+
+    return _fit_result(names, best, states)
+
+def _fit_result(names: list, best: dict, states: list):
+
+    # results are sent as JSON, which has no infinities, so costs of fits that never evaluated are null
+    return {
+        'parameters': dict([(name, float(value)) for name, value in zip(names, best['parameters'])]),
+        'cost': float(best['cost']) if np.isfinite(best['cost']) else None,
+        'iterations': int(sum(state['iterations'] for state in states)),
+        'converged': bool(best['converged']),
+        'starts': len(states)
+    }
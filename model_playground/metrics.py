@@ -0,0 +1,211 @@
+import os
+import glob
+import json
+import time
+import bisect
+import tempfile
+import threading
+from contextlib import contextmanager
+
+# upper bounds (in seconds) of latency histogram buckets
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+PROMETHEUS_MIMETYPE = 'text/plain; version=0.0.4; charset=utf-8'
+SNAPSHOT_INTERVAL = 1.0 # seconds between writes of the metrics of a process to a shared directory
+
+class Histogram:
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS):
+        """
+        A cumulative histogram of observed values, in the style of Prometheus histograms.
+        """
+
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1) # the last bucket holds values above all bounds
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+class MetricsRegistry:
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS):
+        """
+        Collects counters and latency histograms, keyed by metric name and labels, and renders them
+        in the Prometheus text exposition format. Metrics are kept per process, unless shared between
+        processes with share.
+        """
+
+        self.buckets = buckets
+        self.directory = None
+        self._counters = {}
+        self._histograms = {}
+        self._descriptions = {}
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._changed = False
+
+    def share(self, directory: str):
+        """
+        Shares metrics between processes forked after this call, e.g. the workers of server.run_workers. Every
+        process writes its own metrics to directory, at most SNAPSHOT_INTERVAL seconds after they change, and
+        renders the sum of the metrics of all processes. Metrics recorded before forking are not shared.
+        """
+
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+
+    def describe(self, name: str, description: str):
+        self._descriptions[name] = description
+
+    def increment(self, name: str, value: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._check_process()
+            self._counters[key] = self._counters.get(key, 0) + value
+            self._changed = True
+
+    def observe(self, name: str, value: float, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._check_process()
+            if key not in self._histograms:
+                self._histograms[key] = Histogram(self.buckets)
+            self._histograms[key].observe(value)
+            self._changed = True
+
+    def _check_process(self):
+        """
+        Private method, called with the lock held, that starts the metrics of a forked process afresh, along with
+        the thread writing them to the shared directory. Otherwise, metrics inherited from the parent process
+        would be counted once per child.
+        """
+
+        if self.directory is None or self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._counters, self._histograms = {}, {}
+        threading.Thread(target=self._write_snapshots, daemon=True).start()
+
+    def _snapshot(self):
+        with self._lock:
+            counters = [(name, list(labels), value) for (name, labels), value in self._counters.items()]
+            histograms = [(name, list(labels), list(histogram.counts), histogram.sum, histogram.count) for (name, labels), histogram in self._histograms.items()]
+            self._changed = False
+        return {'counters': counters, 'histograms': histograms}
+
+    def _write_snapshot(self):
+        """
+        Private method for writing the metrics of this process to the shared directory. Files are replaced
+        atomically, so readers never see partial snapshots.
+        """
+
+        descriptor, temporary_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(descriptor, 'w') as file:
+            json.dump(self._snapshot(), file)
+        os.replace(temporary_path, os.path.join(self.directory, f'metrics-{os.getpid()}.json'))
+
+    def _write_snapshots(self):
+        while True:
+            time.sleep(SNAPSHOT_INTERVAL)
+            if self._changed:
+                self._write_snapshot()
+
+    def _collect(self):
+        """
+        Private method returning counters and histogram states, keyed by metric name and labels: those of this
+        process, or if metrics are shared, the sums over the snapshots of all processes.
+        """
+
+        if self.directory is None:
+            with self._lock:
+                counters = dict(self._counters)
+                histograms = dict((key, (list(histogram.counts), histogram.sum, histogram.count)) for key, histogram in self._histograms.items())
+            return counters, histograms
+
+        # the snapshot of this process is brought up to date first; snapshots of processes that exited are kept
+        with self._lock:
+            self._check_process()
+        self._write_snapshot()
+        counters, histograms = {}, {}
+        for path in glob.glob(os.path.join(self.directory, 'metrics-*.json')):
+            try:
+                with open(path, 'r') as file:
+                    snapshot = json.load(file)
+            except (OSError, ValueError):
+                continue
+            for name, labels, value in snapshot['counters']:
+                key = (name, tuple(tuple(label) for label in labels))
+                counters[key] = counters.get(key, 0) + value
+            for name, labels, counts, total, count in snapshot['histograms']:
+                key = (name, tuple(tuple(label) for label in labels))
+                previous_counts, previous_total, previous_count = histograms.get(key, ([0] * len(counts), 0.0, 0))
+                histograms[key] = ([a + b for a, b in zip(previous_counts, counts)], previous_total + total, previous_count + count)
+        return counters, histograms
+
+    def render(self):
+        """
+        Renders all metrics in the Prometheus text exposition format.
+        """
+
+        lines = []
+        counters, histograms = self._collect()
+        counters, histograms = sorted(counters.items()), sorted(histograms.items())
+
+        described = set()
+        def add_header(name: str, kind: str):
+            if name not in described:
+                described.add(name)
+                if name in self._descriptions:
+                    lines.append(f'# HELP {name} {self._descriptions[name]}')
+                lines.append(f'# TYPE {name} {kind}')
+
+        for (name, labels), value in counters:
+            add_header(name, 'counter')
+            lines.append(f'{name}{_format_labels(labels)} {value}')
+
+        for (name, labels), (counts, total, count) in histograms:
+            add_header(name, 'histogram')
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = '+Inf' if bound == float('inf') else repr(float(bound))
+                lines.append(f'{name}_bucket{_format_labels(labels + (("le", le),))} {cumulative}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {total}')
+            lines.append(f'{name}_count{_format_labels(labels)} {count}')
+
+        return '\n'.join(lines) + '\n'
+
+def _format_labels(labels: tuple):
+    if not labels:
+        return ''
+    escaped = [(key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) for key, value in labels]
+    return '{' + ','.join(f'{key}="{value}"' for key, value in escaped) + '}'
+
+class RequestTimer:
+    def __init__(self):
+        """
+        Accumulates the time spent in named phases of handling a request.
+        """
+
+        self.start = time.perf_counter()
+        self.phases = {}
+
+    @contextmanager
+    def time(self, phase: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[phase] = self.phases.get(phase, 0.0) + time.perf_counter() - start
+
+    def total(self):
+        return time.perf_counter() - self.start
+
+    def server_timing(self):
+        """
+        Formats phase durations (in milliseconds) as a Server-Timing header value.
+        """
+
+        phases = list(self.phases.items()) + [('total', self.total())]
+        return ', '.join(f'{phase};dur={duration * 1000:.3f}' for phase, duration in phases)
@@ -1,18 +1,29 @@
 import inspect
+import marshal
+import hashlib
+import threading
 import numpy as np
 from flask import Flask
 from numbers import Number
+from collections import OrderedDict
 from typing import Callable, Union
+from .disk_cache import DiskCache
+
+SENSITIVITY_METHODS = ('forward', 'central', 'complex')
+UNCERTAINTY_DISTRIBUTIONS = ('uniform', 'normal', 'lognormal')
+COMPLEX_STEP_SCALE = 1e-20 # complex steps are taken as a fraction of slider step sizes, since they do not suffer from cancellation
+PROBE_SCALE = 1e-3 # relative size of the perturbations of broadcast probe sets
+GOLDEN_FRACTION = (np.sqrt(5) - 1) / 2 # offsets perturbations of successive probe sets without repeating
 
 def to_list(array: Union[list, np.ndarray]):
     """ 
     Utility function that converts an array input to a list. Ensures that 
     the input and elements within it are converted to lists.
     """
-    if type(array) == np.ndarray:
+    if isinstance(array, np.ndarray):
         array = array.tolist()
     elif type(array) == list:
-        array = [i.tolist() if type(i) == np.ndarray else i for i in array]
+        array = [i.tolist() if isinstance(i, np.ndarray) else i for i in array]
     return array
 
 def to_numpy(l: list):
@@ -25,14 +36,18 @@ def to_numpy(l: list):
 class IndependentVariableCollection:
     def __init__(self, names: Union[list, np.ndarray], value_arrays: Union[list, np.ndarray], units: Union[list, np.ndarray]=[]):
         """
-        A utility class for organizing data associated with model independent variables.
+        A utility class for organizing data associated with model independent variables. Value arrays that are
+        already np.ndarrays (including memory-mapped arrays) are kept as they are, without copies.
         """
 
         IndependentVariableCollection._parse_inputs(names, value_arrays, units)
         self.names = to_list(names)
-        self.value_arrays = to_numpy(value_arrays)
+        self.value_arrays = [IndependentVariableCollection._to_value_array(value_array) for value_array in value_arrays]
         units = units if len(units) > 0 else [None] * len(names)
         self.units = to_list(units)
+
+        # value arrays never change, so conversions for serialization are built once, when first requested
+        self._conversions = {}
     
     @staticmethod
     def _parse_inputs(names, value_arrays, units):
@@ -47,19 +62,57 @@ class IndependentVariableCollection:
         input_length_set = set([len(input) for input in inputs])
         input_length_set.discard(0)
         assert len(input_length_set) == 1, 'IndependentVariableCollection Error: The length of input lists must be identical.'
-        assert set([type(input) for input in inputs]).issubset(set([np.ndarray, list])), 'IndependentVariableCollection Error: Inputs must be lists or np.ndarrays.'
 
-        # ensure value_arrays contains elements of the correct datatype
-        for value_array in value_arrays:
-            assert type(value_array) == list or type(value_array) == np.ndarray, "IndependentVariableCollection Error: Elements within value_arrays must be lists or np.ndarrays."
-            assert set([isinstance(value, Number) for value in value_array]) == set([True]), "IndependentVariableCollection Error: Numeric data is required for value_arrays."
+    @staticmethod
+    def _to_value_array(value_array):
+        """ 
+        Private static method for converting a value array to a np.ndarray, without copying np.ndarrays. Values
+        are validated by dtype rather than element by element.
+        """
+
+        assert isinstance(value_array, (list, np.ndarray)), "IndependentVariableCollection Error: Elements within value_arrays must be lists or np.ndarrays."
+        value_array = np.asanyarray(value_array)
+
+        # lists mixing numeric types (e.g. Fractions) are converted to floats
+        if value_array.dtype == object:
+            try:
+                value_array = value_array.astype(float)
+            except (TypeError, ValueError):
+                pass
+
+        assert value_array.dtype.kind in 'biufc', "IndependentVariableCollection Error: Numeric data is required for value_arrays."
+        assert value_array.ndim == 1, "IndependentVariableCollection Error: Elements within value_arrays must be one dimensional."
+        return value_array
 
     def get_names(self):
         return self.names
     
-    def get_value_arrays(self, aslist=True):
-        value_arrays = to_list(self.value_arrays) if aslist else self.value_arrays
-        return value_arrays
+    def get_value_arrays(self, aslist=True, dtype: str = None):
+        """ 
+        Returns value arrays as lists, or as np.ndarrays, optionally cast to dtype. Lists and cast arrays are
+        cached, and must not be modified.
+        """
+
+        if not aslist and dtype is None:
+            return self.value_arrays
+        return [self.convert_value_array(value_array, aslist=aslist, dtype=dtype) for value_array in self.value_arrays]
+
+    def convert_value_array(self, value_array: np.ndarray, aslist=True, dtype: str = None):
+        """ 
+        Returns one of the value arrays (identified by identity) as a list, or cast to dtype, or None if value_array
+        is not one of them. Conversions are cached per value array, and must not be modified.
+        """
+
+        for index, candidate in enumerate(self.value_arrays):
+            if candidate is value_array:
+                break
+        else:
+            return None
+
+        key = (index, aslist, dtype)
+        if key not in self._conversions:
+            self._conversions[key] = to_list(value_array) if aslist else np.ascontiguousarray(value_array, dtype=dtype)
+        return self._conversions[key]
     
     def get_units(self):
         return self.units
@@ -71,26 +124,31 @@ class ParameterCollection:
             initial_values: Union[list, np.ndarray], 
             lower_bounds: Union[list, np.ndarray], 
             upper_bounds: Union[list, np.ndarray], 
-            units: Union[list, np.ndarray]=[]):
+            units: Union[list, np.ndarray]=[],
+            uncertainties: list = []):
         """
-        A utility class for organizing data associated with model parameters.
+        A utility class for organizing data associated with model parameters. Uncertainties of parameters are
+        None (certain), a number for a uniform distribution over the parameter value +/- that number, or a
+        (distribution, scale) tuple: ('uniform', half width), ('normal', standard deviation) or ('lognormal',
+        standard deviation of the log of the parameter value). Distributions are centered on parameter values.
         """
 
-        ParameterCollection._parse_inputs(names, initial_values, lower_bounds, upper_bounds, units)
+        ParameterCollection._parse_inputs(names, initial_values, lower_bounds, upper_bounds, units, uncertainties)
         self.names = to_list(names)
         self.initial_values = to_list(initial_values)
         self.lower_bounds = to_list(lower_bounds)
         self.upper_bounds = to_list(upper_bounds)
         units = units if len(units) > 0 else [None] * len(names)
         self.units = to_list(units)
+        self.uncertainties = list(uncertainties) if len(uncertainties) > 0 else [None] * len(names)
 
     @staticmethod
-    def _parse_inputs(names, initial_values, lower_bounds, upper_bounds, units):
+    def _parse_inputs(names, initial_values, lower_bounds, upper_bounds, units, uncertainties=[]):
         """ 
         Private static method for ensuring input parameters satisfy assumptions of the program.
         """
 
-        inputs = (names, initial_values, lower_bounds, upper_bounds, units)
+        inputs = (names, initial_values, lower_bounds, upper_bounds, units, uncertainties)
 
         # ensure consistent length and datatype of input arrays
         assert set([isinstance(input, (list, np.ndarray)) for input in inputs]) == set([True]), 'ParameterCollection Error: Inputs must be lists or np.ndarrays.'
@@ -102,6 +160,12 @@ class ParameterCollection:
         assert set([isinstance(value, Number) for value in lower_bounds]) == set([True]), "ParameterCollection Error: Numeric data is required for lower_bounds."
         assert set([isinstance(value, Number) for value in upper_bounds]) == set([True]), "ParameterCollection Error: Numeric data is required for upper_bounds."
 
+        for uncertainty in uncertainties:
+            if isinstance(uncertainty, (tuple, list)):
+                assert len(uncertainty) == 2 and uncertainty[0] in UNCERTAINTY_DISTRIBUTIONS, f"ParameterCollection Error: uncertainties must be (distribution, scale) tuples, with distributions in {UNCERTAINTY_DISTRIBUTIONS}."
+                uncertainty = uncertainty[1]
+            assert uncertainty is None or (isinstance(uncertainty, Number) and uncertainty >= 0), "ParameterCollection Error: Scales of uncertainties must be non-negative numbers."
+
     def get_names(self):
         return self.names
     
@@ -117,6 +181,73 @@ class ParameterCollection:
     def get_units(self):
         return self.units
 
+    def get_uncertainties(self):
+        return self.uncertainties
+
+    def is_uncertain(self):
+        return any(uncertainty[1] if isinstance(uncertainty, (tuple, list)) else uncertainty for uncertainty in self.uncertainties)
+
+class EvaluationCache:
+    def __init__(self, max_entries: int = 128, max_bytes: int = None):
+        """
+        A bounded least-recently-used cache for model outputs, keyed on parameter vectors.
+        Entries are evicted once either max_entries or max_bytes is exceeded.
+        """
+
+        assert max_entries is None or max_entries > 0, 'EvaluationCache Error: max_entries must be a positive integer.'
+        assert max_bytes is None or max_bytes > 0, 'EvaluationCache Error: max_bytes must be a positive integer.'
+        assert max_entries is not None or max_bytes is not None, 'EvaluationCache Error: either max_entries or max_bytes must be set.'
+
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.nbytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: tuple, value: np.ndarray):
+
+        # entries larger than the whole budget are never stored
+        if self.max_bytes is not None and value.nbytes > self.max_bytes:
+            return
+
+        value.setflags(write=False)
+        with self._lock:
+            if key in self._entries:
+                self.nbytes -= self._entries.pop(key).nbytes
+            self._entries[key] = value
+            self.nbytes += value.nbytes
+
+            while (self.max_entries is not None and len(self._entries) > self.max_entries) or (self.max_bytes is not None and self.nbytes > self.max_bytes):
+                _, evicted = self._entries.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def get_info(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'entries': len(self._entries),
+            'nbytes': self.nbytes,
+            'max_entries': self.max_entries,
+            'max_bytes': self.max_bytes
+        }
+
 class Model:
     def __init__(
             self, 
@@ -126,6 +257,11 @@ class Model:
             parameter_collection: ParameterCollection,
             prediction_names: Union[list, np.ndarray] = [],
             prediction_units:Union[list, np.ndarray] = [],
+            cache_size: int = 0,
+            cache_bytes: int = None,
+            cache_quantize: bool = False,
+            disk_cache: str = None,
+            disk_cache_bytes: int = None,
             ):
         
         Model._parse_inputs(model, name, independent_variable_collection, parameter_collection, prediction_units, prediction_names)
@@ -138,12 +274,34 @@ class Model:
         self.prediction_units = prediction_units
         self.slider_data = self._generate_slider_data()
 
+        # models of two independent variables are evaluated over a broadcast grid: the first varies along columns
+        # and the second along rows, so outputs have shape (number of y values, number of x values)
+        value_arrays = self.independent_variable_collection.get_value_arrays(aslist=False)
+        self.surface = len(value_arrays) == 2
+        self.grid_shape = (len(value_arrays[1]), len(value_arrays[0])) if self.surface else None
+        if self.surface:
+            value_arrays = [value_arrays[0][np.newaxis, :], value_arrays[1][:, np.newaxis]]
+
         # private dictionaries to map parameter names to values or value arrays
-        self._independent_variable_dictionary = dict([(argname, value_range) for argname, value_range in zip(self.independent_variable_collection.get_names(), self.independent_variable_collection.get_value_arrays(aslist=False))])
+        self._independent_variable_dictionary = dict([(argname, value_range) for argname, value_range in zip(self.independent_variable_collection.get_names(), value_arrays)])
         self._parameter_dictionary = dict([(argname, argvalue) for argname, argvalue in zip(self.parameter_collection.get_names(), self.parameter_collection.get_initial_values())])
         self._argument_dictionary = dict(
             **self._independent_variable_dictionary, 
             **self._parameter_dictionary)
+
+        # whether the model callable broadcasts over stacked parameter sets, determined on first batch evaluation
+        self._broadcastable = None
+        self._no_predictions = None
+
+        # optional memoization of model outputs, in memory and on disk, disabled by default
+        self.cache = None
+        self.cache_quantize = False
+        if cache_size or cache_bytes:
+            self.enable_cache(max_entries=cache_size or None, max_bytes=cache_bytes, quantize=cache_quantize)
+        self.disk_cache = None
+        self._disk_cache_prefix = None
+        if disk_cache:
+            self.enable_disk_cache(disk_cache, max_bytes=disk_cache_bytes)
         
     def _parse_inputs(model, name, independent_variable_collection, parameter_collection, prediction_units, prediction_names):
 
@@ -194,15 +352,512 @@ class Model:
 
         return slider_datas
         
-    def evaluate(self):
+    def enable_cache(self, max_entries: int = 128, max_bytes: int = None, quantize: bool = False):
+        """ 
+        Enables memoization of model outputs in a bounded LRU cache. If quantize is set, parameter
+        values are snapped to the slider grid (see _quantize) before they are evaluated, so that nearby
+        slider positions share an entry, at the cost of outputs being those of the nearest grid position.
+        """
+
+        self.cache = EvaluationCache(max_entries=max_entries, max_bytes=max_bytes)
+        self.cache_quantize = quantize
+
+    def get_cache_info(self):
+        return self.cache.get_info() if self.cache else None
+
+    def enable_disk_cache(self, directory: str, max_bytes: int = None):
+        """ 
+        Enables a persistent cache of model outputs in directory, shared across restarts and by every process that
+        enables it. Entries are keyed on a hash of the model source, the independent variable arrays and the cache
+        key of the parameter vector (see enable_cache), and evicted least-recently-used once the cache exceeds
+        max_bytes. The memory cache, if enabled, is checked first.
+        """
+
+        self.disk_cache = DiskCache(directory, max_bytes=max_bytes)
+
+    def get_disk_cache_info(self):
+        return self.disk_cache.get_info() if self.disk_cache else None
+
+    def get_source_hash(self):
+        """ 
+        Returns a hash of the model callable: its compiled code (including nested functions), and the numbers,
+        strings and arrays it reads from closures and module globals. Other state it depends on, such as functions
+        it calls, is not hashed, so disk caches must be cleared when that state changes.
+        """
+
+        hasher = hashlib.sha256()
+        model = self.model if hasattr(self.model, '__code__') else type(self.model).__call__
+        hasher.update(marshal.dumps(model.__code__))
+
+        cells = [cell.cell_contents for cell in (model.__closure__ or []) if cell.cell_contents is not None]
+        global_values = [model.__globals__[name] for name in model.__code__.co_names if name in model.__globals__]
+        for value in cells + global_values:
+            if isinstance(value, (Number, str, bytes)):
+                hasher.update(repr(value).encode())
+            elif isinstance(value, np.ndarray) and not value.dtype.hasobject:
+                hasher.update(repr((value.dtype.str, value.shape)).encode() + np.ascontiguousarray(value).tobytes())
+        return hasher.hexdigest()
+
+    def _disk_cache_key(self, key: tuple):
+        """ 
+        Private method for building the content address of an output on disk from its memory cache key.
+        """
+
+        if self._disk_cache_prefix is None:
+            hasher = hashlib.sha256(self.get_source_hash().encode())
+            for name, value_array in zip(self.independent_variable_collection.get_names(), self.independent_variable_collection.get_value_arrays(aslist=False)):
+                hasher.update(repr((name, value_array.dtype.str, value_array.shape)).encode() + np.ascontiguousarray(value_array).tobytes())
+            self._disk_cache_prefix = hasher.hexdigest()
+
+        return hashlib.sha256(repr((self._disk_cache_prefix, self.cache_quantize, key)).encode()).hexdigest()
+
+    def prewarm_disk_cache(self, chunk_size: int = 64):
+        """ 
+        Stores outputs at the initial parameter values, which every session starts from, and at every position of
+        each slider with the other parameters at their initial values: the states reached by moving a single slider.
+        Outputs already on disk are skipped, and missing ones evaluated with evaluate_batch. Positions match slider
+        values exactly when parameters are quantized. Returns the number of stored outputs. Parameter sets are
+        evaluated chunk_size at a time.
+        """
+
+        assert self.disk_cache, 'Model Error: enable_disk_cache must be called before prewarm_disk_cache.'
+
+        names = self.parameter_collection.get_names()
+        initial_values = np.array([slider_data['initial_value'] for slider_data in self.slider_data], dtype=float)
+        candidates = [initial_values]
+        for index, slider_data in enumerate(self.slider_data):
+            stepsize = slider_data['stepsize']
+            no_positions = int(round((slider_data['max'] - slider_data['min']) / stepsize)) + 1 if stepsize > 0 else 1
+            for value in slider_data['min'] + stepsize * np.arange(no_positions):
+                row = initial_values.copy()
+                row[index] = value
+                candidates.append(row)
+
+        rows, keys = [], set()
+        for row in candidates:
+            parameter_dictionary = dict(zip(names, row))
+            if self.cache_quantize:
+                parameter_dictionary = self._quantize(parameter_dictionary)
+                row = np.array([parameter_dictionary[name] for name in names])
+            key = self._disk_cache_key(self._cache_key(parameter_dictionary))
+            if key not in keys and not self.disk_cache.contains(key):
+                rows.append(row)
+                keys.add(key)
+
+        for start in range(0, len(rows), chunk_size):
+            chunk = rows[start:start + chunk_size]
+            for row, output in zip(chunk, self.evaluate_batch(np.array(chunk))):
+                self.disk_cache.put(self._disk_cache_key(self._cache_key(dict(zip(names, row)))), output)
+        return len(rows)
+
+    def _cache_key(self, parameter_dictionary: dict):
+        """ 
+        Private method for building a hashable cache key from a parameter dictionary.
+        """
+
+        return tuple(float(parameter_dictionary[slider_data['name']]) for slider_data in self.slider_data)
+
+    def _quantize(self, parameter_dictionary: dict):
+        """ 
+        Private method for snapping parameter values to the grid of slider positions. Returns a new parameter
+        dictionary, which is both evaluated and cached, so cached outputs are exact for their keys.
+        """
+
+        parameter_dictionary = dict(parameter_dictionary)
+        for slider_data in self.slider_data:
+            name, lower_bound, stepsize = slider_data['name'], slider_data['min'], slider_data['stepsize']
+            if stepsize <= 0:
+                continue
+            value = float(parameter_dictionary[name])
+            parameter_dictionary[name] = float(lower_bound + round((value - lower_bound) / stepsize) * stepsize)
+        return parameter_dictionary
+
+    def _call(self, parameter_dictionary: dict):
+        """ 
+        Private method for calling the model callable on a single parameter set.
+        """
+
+        output = np.asarray(self.model(**self._independent_variable_dictionary, **parameter_dictionary))
+        if self.surface:
+            output = output if output.ndim > 2 else output[np.newaxis] # add dummy dimension to output if 2D
+
+            # outputs independent of one of the variables are expanded over the grid
+            if output.shape[1:] != self.grid_shape:
+                output = np.ascontiguousarray(np.broadcast_to(output, output.shape[:1] + self.grid_shape))
+            return output
+
+        output = output if output.ndim > 1 else output[np.newaxis] # add dummy dimension to output if 1D
+        return output
+
+    def _call_broadcast(self, param_matrix: np.ndarray, no_predictions: int):
+        """ 
+        Private method for calling the model callable once over a stack of parameter sets. Independent
+        variables gain a leading axis and parameters gain trailing axes, so that outputs broadcast to
+        shape (N, ...) or (number of predictions, N, ...).
+        """
+
+        no_sets = len(param_matrix)
+        point_ndim = 2 if self.surface else 1
+        arguments = dict([(argname, value_range[np.newaxis]) for argname, value_range in self._independent_variable_dictionary.items()])
+        for index, argname in enumerate(self.parameter_collection.get_names()):
+            arguments[argname] = param_matrix[(slice(None), index) + (np.newaxis,) * point_ndim]
+
+        output = np.asarray(self.model(**arguments))
+        if no_predictions == 1 and output.ndim == point_ndim + 1 and output.shape[0] == no_sets:
+            output = output[:, np.newaxis]
+        elif output.ndim == point_ndim + 2 and output.shape[:2] == (no_predictions, no_sets):
+            output = np.swapaxes(output, 0, 1)
+        else:
+            return None
+
+        if self.surface and output.shape[2:] != self.grid_shape:
+            output = np.broadcast_to(output, output.shape[:2] + self.grid_shape)
+        return output
+
+    def _probe_rows(self, row: np.ndarray, no_rows: int):
         """ 
-        Evaluates the model with set independent variables and parameters. Outputs are lists to ensure that they are JSON serializable.
+        Private method for building no_rows parameter vectors that differ from each other in every parameter: row,
+        followed by small perturbations of it, which step backwards from upper slider bounds so that they stay
+        within slider ranges, where models are known to be valid.
         """
 
-        output = to_list(self.model(**self._argument_dictionary))
-        output = output if type(output[0]) == list else [output] # add dummy dimension to output if 1D
+        values = row.real.astype(float)
+        upper_bounds = np.array([slider_data['max'] for slider_data in self.slider_data], dtype=float)
+        scales = np.maximum(np.abs(values), PROBE_SCALE * np.maximum(upper_bounds - np.array([slider_data['min'] for slider_data in self.slider_data], dtype=float), 1))
+        rows = np.tile(row, (no_rows, 1))
+        for index in range(1, no_rows):
+
+            # perturbations are offset per parameter, so probe rows are not collinear
+            steps = PROBE_SCALE * scales * (1 + (index * GOLDEN_FRACTION + np.arange(len(values)) * np.sqrt(2)) % 1)
+            rows[index] = np.where(values + steps > upper_bounds, values - steps, values + steps)
+        return rows
+
+    def _check_broadcast(self, param_matrix: np.ndarray):
+        """ 
+        Private method for determining whether the model callable broadcasts correctly, by comparing a single
+        broadcast call against per-set calls. Probe sets differ in every parameter, so that callables combining
+        parameter values across sets (e.g. with np.max) are never taken to broadcast.
+        """
+
+        names = self.parameter_collection.get_names()
+        no_predictions = self._call(dict(zip(names, param_matrix[0]))).shape[0]
+        self._no_predictions = no_predictions
+
+        # probe with one more set than there are predictions so output axes cannot be confused
+        probe = self._probe_rows(param_matrix[0], max(no_predictions + 1, 2)).astype(param_matrix.dtype)
+        try:
+            with np.errstate(all='ignore'):
+                expected = [self._call(dict(zip(names, row))) for row in probe]
+                output = self._call_broadcast(probe, no_predictions)
+        except Exception:
+            return False
+
+        if output is None or output.shape[1:] != expected[0].shape:
+            return False
+        return all(np.allclose(output[index], expected[index], equal_nan=True) for index in range(len(probe)))
+
+    def evaluate_batch(self, param_matrix: Union[list, np.ndarray], chunk_size: int = 1024, dtype: type = float):
+        """ 
+        Evaluates the model with set independent variables over many parameter sets. Rows of param_matrix
+        are parameter vectors ordered as in the parameter collection. If the model callable broadcasts, each
+        chunk of rows is evaluated in a single call; otherwise rows are evaluated one at a time. Outputs are
+        contiguous np.ndarrays with shape (N, number of predictions, number of points), or
+        (N, number of predictions, number of y values, number of x values) for models of two independent variables.
+        Parameter values are passed to the model callable as dtype.
+        """
+
+        param_matrix = np.asarray(param_matrix, dtype=dtype)
+        param_matrix = param_matrix if param_matrix.ndim == 2 else param_matrix.reshape(1, -1)
+        names = self.parameter_collection.get_names()
+        assert param_matrix.shape[1] == len(names), 'Model Error: param_matrix must have shape (N, number of parameters).'
+        assert chunk_size > 0, 'Model Error: chunk_size must be a positive integer.'
+
+        if self._broadcastable is None and len(param_matrix) > 0:
+            self._broadcastable = self._check_broadcast(param_matrix)
+
+        output = None
+        for start in range(0, len(param_matrix), chunk_size):
+            chunk = param_matrix[start:start + chunk_size]
+            chunk_output = self._call_broadcast(chunk, self._no_predictions) if self._broadcastable else None
+            if chunk_output is None:
+                chunk_output = np.stack([self._call(dict(zip(names, row))) for row in chunk])
+
+            if output is None:
+                output = np.empty((len(param_matrix),) + chunk_output.shape[1:], dtype=chunk_output.dtype)
+            output[start:start + len(chunk)] = chunk_output
+
+        # empty batches keep the shape of outputs, which is read from an evaluation at the set parameters
+        if output is None:
+            output = np.empty((0,) + self._evaluate_array().shape, dtype=float)
         return output
 
+    def sensitivity(self, parameters: dict = None, method: str = 'central'):
+        """ 
+        Computes the derivatives of model outputs with respect to every parameter at once, perturbing parameters by
+        their slider step sizes. All perturbed parameter sets are evaluated in a single evaluate_batch call. Forward
+        differences take one extra set per parameter, and step backwards from upper bounds; central differences take
+        two, and become one-sided at bounds. The complex method takes complex steps, which are exact to rounding, but requires a model callable that
+        accepts complex parameter values and returns complex outputs; a TypeError is raised otherwise. Outputs are np.ndarrays with shape (number of parameters, number of
+        predictions, ...), where trailing axes index points as in evaluate_batch.
+        """
+
+        assert method in SENSITIVITY_METHODS, f'Model Error: method must be one of {SENSITIVITY_METHODS}.'
+
+        parameter_dictionary = self._parameter_dictionary if parameters is None else dict(self._parameter_dictionary, **parameters)
+        if any(np.iscomplexobj(parameter_dictionary[name]) for name in self.parameter_collection.get_names()):
+            raise TypeError('Model Error: sensitivities are computed at real parameter values only.')
+        values = np.array([float(parameter_dictionary[name]) for name in self.parameter_collection.get_names()])
+        steps = np.array([slider_data['stepsize'] for slider_data in self.slider_data], dtype=float)
+        steps = np.where(steps > 0, steps, np.sqrt(np.finfo(float).eps) * np.maximum(np.abs(values), 1)) # sliders with empty ranges
+        lower_bounds = np.array([slider_data['min'] for slider_data in self.slider_data], dtype=float)
+        upper_bounds = np.array([slider_data['max'] for slider_data in self.slider_data], dtype=float)
+        bounded = upper_bounds > lower_bounds
+        no_parameters = len(values)
+
+        # perturbed values are kept within slider ranges, where models are known to be valid
+        if method == 'forward':
+            steps = np.where(bounded & (values + steps > upper_bounds), -steps, steps)
+            output = self.evaluate_batch(np.vstack([values, values + np.diag(steps)]))
+            differences = output[1:] - output[0]
+        elif method == 'central':
+            upper_values = np.where(bounded, np.minimum(values + steps, upper_bounds), values + steps)
+            lower_values = np.where(bounded, np.maximum(values - steps, lower_bounds), values - steps)
+            output = self.evaluate_batch(np.vstack([values + np.diag(upper_values - values), values + np.diag(lower_values - values)]))
+            differences, steps = output[:no_parameters] - output[no_parameters:], upper_values - lower_values
+        else:
+            steps = steps * COMPLEX_STEP_SCALE
+            output = self.evaluate_batch(values + 1j * np.diag(steps), dtype=complex)
+
+            # real outputs mean the model callable discarded the complex steps, which would give zero derivatives
+            if not np.iscomplexobj(output):
+                raise TypeError('Model Error: the model callable returned real outputs for complex parameter values. Use the forward or central sensitivity method.')
+            differences = output.imag
+
+        return differences / steps.reshape((-1,) + (1,) * (differences.ndim - 1))
+
+    def _evaluate_array(self, parameters: dict = None):
+        """ 
+        Private method for evaluating the model. Outputs are read-only np.ndarrays with a
+        leading dimension indexing model predictions.
+        """
+
+        parameter_dictionary = self._parameter_dictionary if parameters is None else dict(self._parameter_dictionary, **parameters)
+        if self.cache_quantize:
+            parameter_dictionary = self._quantize(parameter_dictionary)
+
+        if self.cache or self.disk_cache:
+            key = self._cache_key(parameter_dictionary)
+        if self.cache:
+            output = self.cache.get(key)
+            if output is not None:
+                return output
+
+        output = self.disk_cache.get(self._disk_cache_key(key)) if self.disk_cache else None
+        if output is None:
+            output = self._call(parameter_dictionary)
+            if self.disk_cache:
+                self.disk_cache.put(self._disk_cache_key(key), output)
+
+        if self.cache:
+            self.cache.put(key, output)
+        return output
+
+    def evaluate(self, aslist=True, parameters: dict = None):
+        """ 
+        Evaluates the model with set independent variables and parameters. By default, outputs are lists to ensure that they are
+        JSON serializable. Otherwise, outputs are read-only np.ndarrays with a leading dimension indexing model predictions.
+        Parameter values passed in parameters take precedence over set values, without updating them.
+        """
+
+        output = self._evaluate_array(parameters)
+        return to_list(output) if aslist else output
+
+    def get_parameters(self):
+        return dict(self._parameter_dictionary)
+
     def update_parameter(self, param_name: str, new_value: float):
         self._parameter_dictionary[param_name] = new_value
-        self._argument_dictionary = dict(**self._independent_variable_dictionary, **self._parameter_dictionary)
\ No newline at end of file
+        self._argument_dictionary = dict(**self._independent_variable_dictionary, **self._parameter_dictionary)
+
+class MassActionModel(Model):
+    def __init__(
+            self,
+            name: str,
+            species: Union[list, np.ndarray],
+            reactant_matrix: Union[list, np.ndarray],
+            stoichiometry_matrix: Union[list, np.ndarray],
+            rate_constants: Union[list, np.ndarray],
+            initial_conditions: Union[list, np.ndarray],
+            independent_variable_collection: IndependentVariableCollection,
+            parameter_collection: ParameterCollection,
+            prediction_units: Union[list, np.ndarray] = [],
+            rtol: float = None,
+            atol: float = None,
+            cache_size: int = 0,
+            cache_bytes: int = None,
+            cache_quantize: bool = False,
+            disk_cache: str = None,
+            disk_cache_bytes: int = None,
+            ):
+        """
+        A Model of a system of mass action reactions, integrated over its single independent variable (time):
+
+            d[species]/dt = stoichiometry_matrix.T @ (k * prod([species] ** reactant_matrix, axis=1))
+
+        The right hand side and its analytic Jacobian are generated once from the structure of the system, as
+        straight-line scalar code with no matrix operations or powers left to evaluate per solver step. Stacked
+        parameter sets (see Model.evaluate_batch) are accepted, so batches skip the per-row fallback. Predictions
+        are the species concentrations.
+
+        Parameters:
+            species (list): Names of the species.
+            reactant_matrix (list): Reaction orders, with a row per reaction and a column per species.
+            stoichiometry_matrix (list): Net changes of species per reaction, with the shape of reactant_matrix.
+            rate_constants (list): Names of the parameters holding the rate constant of each reaction.
+            initial_conditions (list): Initial concentration of each species, as a number or the name of a parameter.
+            rtol, atol (float): Tolerances of scipy.integrate.odeint.
+        """
+
+        self.species = to_list(species)
+        self.reactant_matrix = np.asarray(reactant_matrix, dtype=float)
+        self.stoichiometry_matrix = np.asarray(stoichiometry_matrix, dtype=float)
+        self.rate_constants = to_list(rate_constants)
+        self.initial_conditions = to_list(initial_conditions)
+        self.rtol, self.atol = rtol, atol
+        MassActionModel._parse_structure(self.species, self.reactant_matrix, self.stoichiometry_matrix, self.rate_constants, self.initial_conditions, independent_variable_collection, parameter_collection)
+
+        namespace = {'np': np}
+        exec(self._generate_source(), namespace)
+        self._rhs, self._jacobian = namespace['rhs'], namespace['jacobian']
+
+        # the model callable takes time and every parameter by name, like user defined model callables
+        time_name = independent_variable_collection.get_names()[0]
+        parameter_names = parameter_collection.get_names()
+        def simulate(*args, **kwargs):
+            arguments = simulate.__signature__.bind(*args, **kwargs).arguments
+            return self._simulate(arguments[time_name], arguments)
+        simulate.__signature__ = inspect.Signature([inspect.Parameter(argname, inspect.Parameter.POSITIONAL_OR_KEYWORD) for argname in [time_name] + parameter_names])
+
+        super().__init__(
+            model=simulate,
+            name=name,
+            independent_variable_collection=independent_variable_collection,
+            parameter_collection=parameter_collection,
+            prediction_names=list(self.species),
+            prediction_units=prediction_units,
+            cache_size=cache_size,
+            cache_bytes=cache_bytes,
+            cache_quantize=cache_quantize,
+            disk_cache=disk_cache,
+            disk_cache_bytes=disk_cache_bytes
+        )
+
+    @staticmethod
+    def _parse_structure(species, reactant_matrix, stoichiometry_matrix, rate_constants, initial_conditions, independent_variable_collection, parameter_collection):
+        """ 
+        Private static method for ensuring the reaction system is consistent with the collections.
+        """
+
+        parameter_names = parameter_collection.get_names()
+        assert len(independent_variable_collection.get_names()) == 1, 'MassActionModel Error: a single independent variable (time) is required.'
+        assert reactant_matrix.ndim == 2 and reactant_matrix.shape == stoichiometry_matrix.shape, 'MassActionModel Error: reactant_matrix and stoichiometry_matrix must be matrices of the same shape.'
+        assert reactant_matrix.shape == (len(rate_constants), len(species)), 'MassActionModel Error: matrices must have a row per rate constant and a column per species.'
+        assert np.all(reactant_matrix >= 0), 'MassActionModel Error: reaction orders must be non-negative.'
+        assert len(initial_conditions) == len(species), 'MassActionModel Error: an initial condition is required for each species.'
+        assert set(rate_constants).issubset(parameter_names), 'MassActionModel Error: rate constants must be parameters.'
+        for initial_condition in initial_conditions:
+            assert isinstance(initial_condition, Number) or initial_condition in parameter_names, 'MassActionModel Error: initial conditions must be numbers or parameters.'
+
+    def _generate_source(self):
+        """ 
+        Private method for generating the right hand side and the Jacobian of the system, as functions of the
+        concentrations y, time t and the rate constants k, in the form taken by scipy.integrate.odeint.
+        """
+
+        no_reactions, no_species = self.reactant_matrix.shape
+
+        def power(species_index: int, order: float):
+            if order > 0 and order == int(order):
+                return ' * '.join([f'c{species_index}'] * int(order))
+            return f'c{species_index} ** {float(order)!r}'
+
+        # derivatives of fractional orders leave negative exponents, which are kept along with positive ones
+        def monomial(reaction_index: int, orders: np.ndarray):
+            return ' * '.join([f'k{reaction_index}'] + [power(species_index, order) for species_index, order in enumerate(orders) if order != 0])
+
+        def linear_combination(terms: list):
+            expression = ''
+            for coefficient, term in terms:
+                if coefficient != 0:
+                    sign = '-' if coefficient < 0 else '+'
+                    term = term if abs(coefficient) == 1 else f'{float(abs(coefficient))!r} * {term}'
+                    expression = f'{sign} {term}' if not expression else f'{expression} {sign} {term}'
+            return (expression[2:] if expression.startswith('+') else expression) or '0.0'
+
+        unpack = [
+            f"    {', '.join([f'c{index}' for index in range(no_species)])}, = y",
+            f"    {', '.join([f'k{index}' for index in range(no_reactions)])}, = k",
+        ]
+
+        lines = ['def rhs(y, t, k):'] + unpack
+        for reaction_index in range(no_reactions):
+            lines.append(f'    v{reaction_index} = {monomial(reaction_index, self.reactant_matrix[reaction_index])}')
+        derivatives = [linear_combination([(self.stoichiometry_matrix[reaction_index, species_index], f'v{reaction_index}') for reaction_index in range(no_reactions)]) for species_index in range(no_species)]
+        lines.append(f"    return [{', '.join(derivatives)}]")
+
+        # the Jacobian, column by column: derivatives of each reaction rate with respect to a species, combined by stoichiometry
+        lines += ['', 'def jacobian(y, t, k):'] + unpack + [f'    jacobian = np.zeros(({no_species}, {no_species}))']
+        for column in range(no_species):
+            rate_derivatives = []
+            for reaction_index in range(no_reactions):
+                order = self.reactant_matrix[reaction_index, column]
+                if order > 0:
+                    orders = self.reactant_matrix[reaction_index].copy()
+                    orders[column] -= 1
+                    rate_derivatives.append((reaction_index, order, monomial(reaction_index, orders)))
+            for row in range(no_species):
+                expression = linear_combination([(self.stoichiometry_matrix[reaction_index, row] * order, derivative) for reaction_index, order, derivative in rate_derivatives])
+                if expression != '0.0':
+                    lines.append(f'    jacobian[{row}, {column}] = {expression}')
+        lines.append('    return jacobian')
+
+        return '\n'.join(lines) + '\n'
+
+    def get_source_hash(self):
+        """ 
+        Returns a hash of the reaction system, which determines the outputs of mass action models.
+        """
+
+        hasher = hashlib.sha256(self._generate_source().encode())
+        hasher.update(repr((self.species, self.rate_constants, self.initial_conditions, self.rtol, self.atol)).encode())
+        return hasher.hexdigest()
+
+    def _simulate(self, time: np.ndarray, arguments: dict):
+        """ 
+        Private method for integrating one or more (stacked) parameter sets. Returns concentrations with shape
+        (species, points), or (species, N, points) for stacked parameter sets.
+        """
+
+        from scipy.integrate import odeint # scipy is only required by mass action models
+
+        time = np.ravel(time)
+        names = self.rate_constants + [value for value in self.initial_conditions if isinstance(value, str)]
+        stacked = any(np.ndim(arguments[name]) > 0 for name in names)
+
+        # odeint integrates real values only: casting would drop imaginary parts, and complex steps with them
+        if any(np.iscomplexobj(arguments[name]) for name in names):
+            raise TypeError('MassActionModel Error: mass action models cannot be evaluated at complex parameter values. Use the forward or central sensitivity method.')
+        rate_constants = np.column_stack(np.broadcast_arrays(*[np.ravel(arguments[name]).astype(float) for name in self.rate_constants]))
+        initial_concentrations = np.column_stack(np.broadcast_arrays(*[np.ravel(arguments[value] if isinstance(value, str) else value).astype(float) for value in self.initial_conditions]))
+        no_sets = max(len(rate_constants), len(initial_concentrations))
+        rate_constants = np.broadcast_to(rate_constants, (no_sets, rate_constants.shape[1]))
+        initial_concentrations = np.broadcast_to(initial_concentrations, (no_sets, initial_concentrations.shape[1]))
+
+        # parameter sets are integrated in turn: a stacked system would step every set at the pace of the stiffest one
+        options = dict([(key, value) for key, value in [('rtol', self.rtol), ('atol', self.atol)] if value is not None])
+        concentrations = np.stack([
+            odeint(self._rhs, initial, time, args=(tuple(rates.tolist()),), Dfun=self._jacobian, **options).T
+            for rates, initial in zip(rate_constants, initial_concentrations)
+        ], axis=1)
+
+        return concentrations if stacked else concentrations[:, 0]
@@ -0,0 +1,255 @@
+import os
+import sys
+import time
+import threading
+import traceback
+import multiprocessing
+from .registry import exec_model_file
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+POOL_KINDS = ('thread', 'process')
+DEFAULT_EVALUATION_TIMEOUT = 10 # seconds
+POLL_INTERVAL = 0.05 # seconds between checks for cancellation while waiting on an evaluation
+
+# models loaded by process pool workers, keyed by model file, along with the modification time they were loaded for
+_worker_models = {}
+
+def get_worker_model(model_file: str, disk_cache_options: dict = None):
+    """
+    Reads a model into memory once per worker process, and again whenever the model file is modified.
+
+    Parameters:
+        model_file (str): Path to the input model.
+        disk_cache_options (dict): Keyword arguments of Model.enable_disk_cache, for models that do not enable a disk cache themselves.
+    """
+
+    mtime = os.stat(model_file).st_mtime_ns
+    if model_file not in _worker_models or _worker_models[model_file][1] != mtime:
+        model = exec_model_file(model_file)
+        if disk_cache_options and not model.disk_cache:
+            model.enable_disk_cache(**disk_cache_options)
+        _worker_models[model_file] = (model, mtime)
+    return _worker_models[model_file][0]
+
+def _evaluate_model(model, parameters: dict, method: str = None):
+    """
+    Evaluates a model, or its sensitivities (see Model.sensitivity) if a sensitivity method is given.
+    """
+
+    if method:
+        return model.sensitivity(parameters=parameters, method=method)
+    return model.evaluate(aslist=False, parameters=parameters)
+
+def _evaluate_model_file(model_file: str, parameters: dict, disk_cache_options: dict = None, method: str = None):
+    return _evaluate_model(get_worker_model(model_file, disk_cache_options), parameters, method)
+
+def _worker_loop(connection):
+    """
+    Serves evaluations sent over a pipe, until the pipe is closed.
+    """
+
+    while True:
+        try:
+            model_file, parameters, disk_cache_options, method = connection.recv()
+        except (EOFError, OSError):
+            return
+        try:
+            result = ('ok', _evaluate_model_file(model_file, parameters, disk_cache_options, method))
+        except Exception as error:
+            result = ('error', (error, traceback.format_exc()))
+
+        # exceptions that cannot be pickled are sent as their messages
+        try:
+            connection.send(result)
+        except Exception:
+            connection.send(('error', (RuntimeError(str(result[1][0])), result[1][1])))
+
+class WorkerProcess:
+    def __init__(self, context):
+        """
+        A process evaluating models from model files, one at a time. Unlike workers of a ProcessPoolExecutor,
+        it can be terminated while it evaluates.
+        """
+
+        self.connection, child_connection = context.Pipe()
+        self.process = context.Process(target=_worker_loop, args=(child_connection,), daemon=True)
+        self.process.start()
+        child_connection.close()
+
+    def terminate(self):
+        self.process.terminate()
+        self.process.join()
+        self.connection.close()
+
+class EvaluationPool:
+    def __init__(self, max_workers: int = None, kind: str = 'thread', timeout: float = DEFAULT_EVALUATION_TIMEOUT, model_file: str = None, disk_cache_options: dict = None):
+        """
+        Runs model evaluations off the request thread, in a pool of threads or processes. Each session
+        has at most one current evaluation: submitting a newer one cancels the previous one.
+
+        Worker processes that time out or are cancelled are terminated, and replaced on demand, so a pathological
+        parameter set never holds a worker for longer than the timeout. Threads cannot be stopped: an abandoned
+        evaluation keeps its thread until it finishes, and once every thread is taken, evaluations are refused
+        with the status 'busy' rather than queued behind abandoned ones.
+
+        Process pools cannot receive models defined in exec'd model files, so each worker process reads
+        the model from a model file instead: either the one passed on submission, or model_file. Models read by
+        worker processes enable the disk cache of disk_cache_options, so that workers share their outputs.
+        """
+
+        assert kind in POOL_KINDS, f'EvaluationPool Error: kind must be one of {POOL_KINDS}.'
+        assert timeout is None or timeout > 0, 'EvaluationPool Error: timeout must be positive.'
+        assert max_workers is None or max_workers > 0, 'EvaluationPool Error: max_workers must be a positive integer.'
+
+        self.kind = kind
+        self.timeout = timeout
+        self.model_file = model_file
+        self.disk_cache_options = disk_cache_options
+        self.max_workers = max_workers or (min(32, (os.cpu_count() or 1) + 4) if kind == 'thread' else os.cpu_count() or 1)
+        self._current_evaluations = {}
+        self._lock = threading.Lock()
+        self._worker_available = threading.Condition(self._lock)
+
+        # threads are counted until their evaluation finishes, abandoned or not; processes are started on demand
+        self._no_running_threads = 0
+        self.executor = ThreadPoolExecutor(self.max_workers) if kind == 'thread' else None
+        self._context = multiprocessing.get_context()
+        self._workers, self._idle_workers = set(), []
+
+    def evaluate(self, session_key: str, model, parameters: dict, model_file: str = None, method: str = None):
+        """
+        Evaluates a model for a session and waits for the result. Returns an (output, status) tuple, where
+        status is one of 'ok', 'timeout', 'cancelled' (superseded by a newer evaluation), 'busy' (no free
+        worker) or 'error'. If status is 'error', output is the exception raised by the evaluation, or None if
+        the worker process died; otherwise, output is None unless status is 'ok'.
+
+        If a sensitivity method is given, sensitivities (see Model.sensitivity) are computed instead of outputs.
+        Sessions computing sensitivities alongside outputs should use a separate session_key for them, so that
+        neither cancels the other.
+        """
+
+        cancelled = threading.Event()
+        with self._lock:
+            previous_cancelled = self._current_evaluations.get(session_key)
+            self._current_evaluations[session_key] = cancelled
+        if previous_cancelled:
+            previous_cancelled.set()
+
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        if self.kind == 'process':
+            assert model_file or self.model_file, 'EvaluationPool Error: a model file is required for process pools.'
+            output, status = self._evaluate_process(model_file or self.model_file, parameters, method, cancelled, deadline)
+        else:
+            output, status = self._evaluate_thread(model, parameters, method, cancelled, deadline)
+
+        with self._lock:
+            if self._current_evaluations.get(session_key) is cancelled:
+                del self._current_evaluations[session_key]
+            elif status == 'ok':
+                output, status = None, 'cancelled'
+        return output, status
+
+    @staticmethod
+    def _remaining(deadline: float):
+        return POLL_INTERVAL if deadline is None else min(POLL_INTERVAL, deadline - time.monotonic())
+
+    def _evaluate_thread(self, model, parameters: dict, method: str, cancelled: threading.Event, deadline: float):
+        """
+        Private method for evaluating in a thread, if one is free.
+        """
+
+        with self._lock:
+            if self._no_running_threads >= self.max_workers:
+                return None, 'busy'
+            self._no_running_threads += 1
+        future = self.executor.submit(_evaluate_model, model, parameters, method)
+        future.add_done_callback(self._release_thread)
+
+        while not cancelled.is_set():
+            remaining = self._remaining(deadline)
+            if remaining <= 0:
+                return None, 'timeout'
+            try:
+                return future.result(timeout=remaining), 'ok'
+            except TimeoutError:
+                continue
+            except Exception as error:
+                traceback.print_exc()
+                return error, 'error'
+        return None, 'cancelled'
+
+    def _release_thread(self, future):
+        with self._lock:
+            self._no_running_threads -= 1
+
+    def _acquire_worker(self, cancelled: threading.Event, deadline: float):
+        """
+        Private method for taking an idle worker process, or starting one if the pool is not full. Returns a
+        (worker, status) tuple, where worker is None if the evaluation was cancelled or no worker became free
+        before the deadline.
+        """
+
+        with self._worker_available:
+            while not self._idle_workers and len(self._workers) >= self.max_workers:
+                remaining = self._remaining(deadline)
+                if cancelled.is_set() or remaining <= 0:
+                    return None, 'cancelled' if cancelled.is_set() else 'busy'
+                self._worker_available.wait(remaining)
+            if self._idle_workers:
+                return self._idle_workers.pop(), 'ok'
+            worker = WorkerProcess(self._context)
+            self._workers.add(worker)
+            return worker, 'ok'
+
+    def _release_worker(self, worker: WorkerProcess, retire: bool = False):
+        """
+        Private method for returning a worker process to the pool, or terminating it if retire is set.
+        """
+
+        if retire:
+            worker.terminate()
+        with self._worker_available:
+            if retire:
+                self._workers.discard(worker)
+            else:
+                self._idle_workers.append(worker)
+            self._worker_available.notify()
+
+    def _evaluate_process(self, model_file: str, parameters: dict, method: str, cancelled: threading.Event, deadline: float):
+        """
+        Private method for evaluating in a worker process, which is terminated if the evaluation is cancelled,
+        times out or fails to respond.
+        """
+
+        worker, status = self._acquire_worker(cancelled, deadline)
+        if worker is None:
+            return None, status
+
+        try:
+            worker.connection.send((model_file, parameters, self.disk_cache_options, method))
+            while not worker.connection.poll(max(self._remaining(deadline), 0)):
+                if cancelled.is_set() or not worker.process.is_alive() or self._remaining(deadline) <= 0:
+                    status = 'cancelled' if cancelled.is_set() else 'error' if not worker.process.is_alive() else 'timeout'
+                    self._release_worker(worker, retire=True)
+                    return None, status
+            status, output = worker.connection.recv()
+        except (EOFError, OSError):
+            traceback.print_exc()
+            self._release_worker(worker, retire=True)
+            return None, 'error'
+
+        self._release_worker(worker)
+        # tracebacks of workers are reported like those of threads, on stderr
+        if status == 'error':
+            error, worker_traceback = output
+            sys.stderr.write(worker_traceback)
+            return error, 'error'
+        return output, 'ok'
+
+    def shutdown(self):
+        if self.executor:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            workers, self._workers, self._idle_workers = list(self._workers), set(), []
+        for worker in workers:
+            worker.terminate()
@@ -0,0 +1,165 @@
+import os
+import re
+import glob
+import time
+import threading
+from .model import Model
+
+# compiled model files, keyed by path, along with the modification time they were compiled for
+_code_cache = {}
+_code_cache_lock = threading.Lock()
+
+class ModelLoadError(Exception):
+    """
+    Raised when a model file cannot be read into memory.
+    """
+
+def compile_model_file(model_file: str):
+    """
+    Compiles a model file, reusing the cached code object if the file has not been modified since.
+    Returns the code object and the modification time it was compiled for.
+
+    Parameters:
+        model_file (str): Path to the input model.
+    """
+
+    model_file = os.path.abspath(model_file)
+    mtime = os.stat(model_file).st_mtime_ns
+    with _code_cache_lock:
+        cached = _code_cache.get(model_file)
+    if cached and cached[1] == mtime:
+        return cached
+
+    with open(model_file, 'r') as file:
+        code = compile(file.read(), model_file, 'exec')
+    with _code_cache_lock:
+        _code_cache[model_file] = (code, mtime)
+    return code, mtime
+
+def exec_model_file(model_file: str):
+    """
+    Executes a model file and returns the Model constructed within it.
+
+    Parameters:
+        model_file (str): Path to the input model.
+    """
+
+    try:
+        code, _ = compile_model_file(model_file)
+        variables = {'__name__': '__model__', '__file__': os.path.abspath(model_file)}
+        exec(code, variables)
+    except Exception as error:
+        raise ModelLoadError(f'Model file {model_file} could not be executed: {error!r}') from error
+
+    # identify variable containing the model
+    for value in variables.values():
+        if isinstance(value, Model):
+            return value
+
+    raise ModelLoadError(f'No Model was constructed in {model_file}. Ensure that you have constructed a Model object in your model file.')
+
+def model_key(model_file: str):
+    """
+    Builds the URL prefix and blueprint name of a model file from its file name.
+    """
+
+    return re.sub(r'\W', '_', os.path.splitext(os.path.basename(model_file))[0])
+
+class RegistryEntry:
+    def __init__(self, model_file: str):
+        """
+        The state of one model in a ModelRegistry.
+        """
+
+        self.model_file = os.path.abspath(model_file)
+        self.model = None
+        self.error = None
+        self.mtime = None
+        self.version = 0 # incremented whenever a model is loaded, so that outputs of previous versions can be told apart
+        self.last_checked = 0.0
+        self.loaded = threading.Event()
+        self.reloading = False
+        self.lock = threading.Lock()
+
+class ModelRegistry:
+    def __init__(self, directory: str, check_interval: float = 1.0):
+        """
+        Serves every model file in a directory. Model files are compiled once and their code objects cached;
+        a model is only re-executed when the modification time of its file changes. Reloads happen in the
+        background while the previous version of the model keeps serving requests, so editing one model does
+        not stall users of the others.
+
+        Parameters:
+            directory (str): Directory containing model files.
+            check_interval (float): Minimum number of seconds between checks of the modification time of a file.
+        """
+
+        assert os.path.isdir(directory), f'ModelRegistry Error: {directory} is not a directory.'
+
+        self.directory = directory
+        self.check_interval = check_interval
+        self.entries = dict([(model_key(model_file), RegistryEntry(model_file)) for model_file in sorted(glob.glob(os.path.join(directory, '*.py')))])
+
+    def keys(self):
+        return list(self.entries.keys())
+
+    def get_model_file(self, key: str):
+        return self.entries[key].model_file
+
+    def get_version(self, key: str):
+        return self.entries[key].version
+
+    def load_all(self, background: bool = True):
+        """
+        Reads all models into memory, in background threads unless background is False.
+        """
+
+        threads = [threading.Thread(target=self._load, args=(entry,), daemon=True) for entry in self.entries.values()]
+        for thread in threads:
+            thread.start()
+        if not background:
+            for thread in threads:
+                thread.join()
+
+    def _load(self, entry: RegistryEntry):
+        with entry.lock:
+
+            # the modification time is recorded even if loading fails, so broken files are only retried once edited
+            try:
+                entry.mtime = os.stat(entry.model_file).st_mtime_ns
+                entry.model, entry.error = exec_model_file(entry.model_file), None
+                entry.version += 1
+            except (OSError, ModelLoadError) as error:
+                entry.error = error
+            entry.last_checked, entry.reloading = time.monotonic(), False
+            entry.loaded.set()
+
+    def get(self, key: str, timeout: float = None):
+        """
+        Returns the model served under key, waiting for it to load if necessary. Starts a background reload
+        if its file was modified. Raises a ModelLoadError if the model cannot be loaded.
+        """
+
+        entry = self.entries[key]
+        if not entry.loaded.is_set() and not entry.lock.locked() and not entry.reloading:
+            entry.reloading = True
+            threading.Thread(target=self._load, args=(entry,), daemon=True).start()
+        if not entry.loaded.wait(timeout):
+            raise ModelLoadError(f'Model {key} is still loading.')
+
+        # check for modifications at most once per check interval
+        now = time.monotonic()
+        if now - entry.last_checked > self.check_interval and not entry.reloading:
+            entry.last_checked = now
+            try:
+                modified = os.stat(entry.model_file).st_mtime_ns != entry.mtime
+            except OSError:
+                modified = False
+            if modified:
+                entry.reloading = True
+                threading.Thread(target=self._load, args=(entry,), daemon=True).start()
+
+        # the previous version of a model keeps serving requests while its file is reloaded or broken
+        if entry.model is None:
+            raise ModelLoadError(str(entry.error))
+        return entry.model
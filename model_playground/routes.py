@@ -1,87 +1,467 @@
-from flask import Flask, Blueprint, render_template, request, jsonify, current_app
-from .model import Model
-import sys
+from flask import Flask, Blueprint, Response, render_template, make_response, stream_with_context, has_request_context, has_app_context, request, session, g, jsonify, current_app
+from .model import Model, EvaluationCache, SENSITIVITY_METHODS
+from .channel import UpdateChannel
+from .pool import EvaluationPool
+from .fitting import read_data, fit_model, FitData
+from .uncertainty import propagate_uncertainty, DEFAULT_LEVEL
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from .transport import to_json, to_binary, BINARY_MIMETYPE, BINARY_DTYPES
+from .downsample import reduce_trace
+from .registry import ModelRegistry, ModelLoadError, exec_model_file
+from .metrics import MetricsRegistry, RequestTimer, PROMETHEUS_MIMETYPE
+from .caching import add_static_version, add_static_cache_headers, make_conditional_response, compress_response
+from contextlib import nullcontext
+import numpy as np
+import threading
+import base64
+import json
+import traceback
+import uuid
+import os
 
 template = Blueprint('template', __name__)
 
-# Set caching headers for all responses
+ROOT_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__))) # location of templates and static content
+STREAM_KEEPALIVE = 15 # seconds between keepalive comments on idle update streams
+SESSION_TRACES_SIZE = 1024 # number of last good outputs of sessions, and of outputs sent to clients, that are kept
+SURFACE_TYPES = ('surface', 'heatmap') # Plotly trace types of models of two independent variables
+DEFAULT_UNCERTAINTY_OPTIONS = {'samples': 4096, 'chunk_size': 256, 'level': DEFAULT_LEVEL} # Monte Carlo sampling of uncertainty bands
+_channels_lock = threading.Lock()
+_pool_lock = threading.Lock()
+
+# Set caching headers for all responses: only routes marking their responses conditional (see
+# make_conditional_response) are stored by browsers. Large payloads are compressed.
 @template.after_request
 def add_cache_headers(response):
-    response.headers['Cache-Control'] = 'no-store, no-cache, must-revalidate, max-age=0'
-    response.headers['Pragma'] = 'no-cache'
-    response.headers['Expires'] = '0'
+    if 'Cache-Control' not in response.headers:
+        response.headers['Cache-Control'] = 'no-store, no-cache, must-revalidate, max-age=0'
+        response.headers['Pragma'] = 'no-cache'
+        response.headers['Expires'] = '0'
+    return compress_response(response)
+
+# Time all requests
+@template.before_request
+def start_request_timer():
+    g.timer = RequestTimer()
+
+# Expose request timings as Server-Timing headers, and aggregate them into metrics
+@template.after_request
+def add_server_timing(response):
+    timer = g.get('timer')
+    if timer:
+        response.headers['Server-Timing'] = timer.server_timing()
+        route = request.url_rule.rule if request.url_rule else 'unknown'
+        record_timings(route, timer)
+        current_app.config['metrics'].increment('model_playground_requests_total', route=route, status=response.status_code)
     return response
 
+def record_timings(route: str, timer: RequestTimer):
+    metrics = current_app.config['metrics']
+    for phase, duration in list(timer.phases.items()) + [('total', timer.total())]:
+        metrics.observe('model_playground_request_phase_seconds', duration, route=route, phase=phase)
+
+def timed(phase: str):
+    """
+    Returns a context manager that adds the time spent within it to a phase of the current request.
+    """
+
+    return g.timer.time(phase) if has_request_context() and g.get('timer') else nullcontext()
+
 def load_model(model_file: str):
     """
-    Reads a model into memory.
+    Reads a model into memory. Raises a ModelLoadError if the model file cannot be executed
+    or does not construct a Model.
 
     Parameters:
         model_file (str): Path to the input model.
     """
 
-    # execute the model file and get variables
-    variables = {}
-    with open(model_file, 'r') as file:
-        exec(file.read(), variables)
+    return exec_model_file(model_file)
 
-    # identify variable containing the model
-    for value in variables.values():
-        if type(value) == Model:
-            return value
-    
-    print('ERROR: Model was not successfully read into memory. Ensure that you have constructed a Model object in your model file.')
-    sys.exit()
+def make_payload_response(payload: dict, binary: bool = False, dtype: str = 'float64', model: Model = None):
+    """
+    Builds a response from a payload containing np.ndarrays, either as JSON or as a binary frame.
 
-# route for serving static content
-@template.route('/')
-def serve_static_content():
+    Parameters:
+        payload (dict): The payload to send.
+        binary (bool): Whether to send np.ndarrays as raw buffers (see transport.to_binary).
+        dtype (str): The dtype of raw buffers, either float32 or float64.
+        model (Model): If given, independent variable arrays of the model in the payload are serialized from
+            conversions cached by its IndependentVariableCollection. Conversions are only built for arrays that
+            the payload contains, e.g. not for those replaced by downsampled traces.
+    """
+
+    with timed('serialize'):
+        convert = None
+        if model and (not binary or dtype in BINARY_DTYPES):
+            collection = model.independent_variable_collection
+            convert = lambda array: collection.convert_value_array(array, aslist=not binary, dtype=dtype if binary else None)
+
+        if binary:
+            return Response(to_binary(payload, dtype=dtype, convert=convert), mimetype=BINARY_MIMETYPE)
+        return jsonify(to_json(payload, convert))
+
+def get_model_key():
+    """
+    Returns the key of the model served by the current request, or None if the app serves a single model.
+    """
+
+    return request.blueprint if current_app.config.get('registry') else None
+
+def get_model():
+    """
+    Returns the model served by the current request, reading it into memory on first use.
+    """
+
+    if current_app.config.get('registry'):
+        return apply_disk_cache(current_app.config['registry'].get(request.blueprint))
 
     if not current_app.config['model']:
-        # read the model into memory
         current_app.config['model'] = load_model(current_app.config['model_file'])
+    return apply_disk_cache(current_app.config['model'])
 
-    return render_template('index.html', model_name=current_app.config['model'].name)
+def apply_disk_cache(model: Model):
+    """
+    Enables the disk cache of the current app on a model that does not enable one itself. Models reloaded by a
+    registry are new objects, so they are checked on every request.
+    """
 
-# route for handling slider data requests
-@template.route('/serve_slider_data', methods=['GET'])
-def serve_slider_data():
-    return jsonify(current_app.config['model'].slider_data)
+    options = current_app.config.get('disk_cache_options')
+    if options and not model.disk_cache:
+        model.enable_disk_cache(**options)
+    return model
 
-# route for handling plot data requests
-@template.route('/serve_plot_data', methods=['GET'])
-def serve_plot_data():
+def get_model_version():
+    """
+    Returns the version of the model served by the current request, which registries increment whenever they
+    reload a model. Outputs are kept per model version, since outputs of previous versions may not even have
+    the shape of current ones.
+    """
+
+    if current_app.config.get('registry'):
+        return current_app.config['registry'].get_version(request.blueprint)
+    return 0
+
+def is_model_outdated(model_version):
+    """
+    Tells whether a client displays outputs of a previous version of the model, and must refetch /serve_plot_data.
+    Clients that do not report a model version are assumed to be current.
+    """
+
+    return model_version is not None and int(model_version) != get_model_version()
+
+def get_model_file():
+    if current_app.config.get('registry'):
+        return current_app.config['registry'].get_model_file(request.blueprint)
+    return current_app.config['model_file']
+
+def get_evaluation_pool():
+    """
+    Returns the evaluation pool of the current app. Pools are created on first use, so that each
+    worker process of a multi-worker server gets its own.
+    """
+
+    if not current_app.config.get('evaluation_pool'):
+        with _pool_lock:
+            if not current_app.config.get('evaluation_pool'):
+                options = dict(current_app.config.get('evaluation_pool_options', {}), disk_cache_options=current_app.config.get('disk_cache_options'))
+                current_app.config['evaluation_pool'] = EvaluationPool(**options)
+    return current_app.config['evaluation_pool']
+
+def get_fit_executor(kind: str):
+    """
+    Returns the executor running multi-start fits and uncertainty sampling of the current app, of the given kind.
+    Like evaluation pools, executors are created on first use.
+    """
+
+    executors = current_app.config['fit_executors']
+    if kind not in executors:
+        with _pool_lock:
+            if kind not in executors:
+                max_workers = current_app.config.get('fit_pool_options', {}).get('max_workers')
+                executors[kind] = ProcessPoolExecutor(max_workers) if kind == 'process' else ThreadPoolExecutor(max_workers)
+    return executors[kind]
+
+def get_session_id():
+    if 'id' not in session:
+        session['id'] = uuid.uuid4().hex
+    return session['id']
+
+def get_session_key():
+    """
+    Returns the key of the state of the current session for the model served by the current request.
+    """
+
+    model_key = get_model_key()
+    return f'{get_session_id()}.{model_key}' if model_key else get_session_id()
+
+def session_field(name: str):
+    """
+    Returns the name of a session field, namespaced by model if the app serves multiple models.
+    """
+
+    model_key = get_model_key()
+    return f'{model_key}.{name}' if model_key else name
+
+def get_session_parameters(model: Model):
+    """
+    Returns the parameter values of the current session. Sessions start from the parameter values of the model,
+    which are never modified by requests.
+    """
+
+    parameters = model.get_parameters()
+    for param_name, param_value in session.get(session_field('parameters'), {}).items():
+        if param_name in parameters:
+            parameters[param_name] = float(param_value)
+    return parameters
+
+def set_session_parameters(parameters: dict):
+    session[session_field('parameters')] = parameters
+
+def get_trace_key(model: Model):
+    return 'z' if model.surface else 'y'
+
+def update_traces(model: Model, session_key: str, parameters: dict, base_output: list = None):
+    """
+    Evaluates the model for a session in the evaluation pool. Returns the outputs, a list of the traces that
+    differ from base_output, in the form {'index', 'y'} (or {'index', 'z'} for surfaces), and the evaluation status.
+    base_output must be the outputs that the client currently displays; if it is None, every trace is reported.
+    If the evaluation did not succeed, the last good outputs of the session are returned and no traces are
+    reported as changed.
+    """
+
+    session_traces, model_version = current_app.config['session_traces'], get_model_version()
+    with timed('evaluate'):
+        output, status = get_evaluation_pool().evaluate(session_key, model, parameters, model_file=get_model_file())
+    current_app.config['metrics'].increment('model_playground_evaluations_total', status=status)
+    if status != 'ok':
+        return session_traces.get((session_key, model_version)), [], status
 
-    x = current_app.config['model'].independent_variable_collection.get_value_arrays()
+    # outputs of a different number of traces, e.g. evaluated while the model was reloaded, are never diffed against
+    if base_output is not None and len(base_output) != len(output):
+        base_output = None
+    changed_traces = []
+    for index, trace in enumerate(output):
+        if base_output is None or not np.array_equal(base_output[index], trace):
+            changed_traces.append({'index': index, get_trace_key(model): trace})
+    session_traces.put((session_key, model_version), output)
+    return output, changed_traces, status
+
+def get_client_output(session_key: str, client_id: str, version: int):
+    """
+    Returns the outputs that a client (a page of a session) displays at one of its versions, or None if this
+    process does not hold them, e.g. because they were evaluated by another worker process. Outputs sent to the
+    client itself are looked up first, then the outputs of the session at that version, which pages start from
+    (see /serve_plot_data). Both were evaluated at the parameters that the session had at that version.
+    """
+
+    if version is None:
+        return None
+    session_traces, model_version = current_app.config['session_traces'], get_model_version()
+    output = session_traces.get((session_key, model_version, str(client_id), int(version))) if client_id is not None else None
+    return output if output is not None else session_traces.get((session_key, model_version, int(version)))
+
+def put_client_output(session_key: str, client_id: str, version: int, output: list):
+    """
+    Keeps the outputs sent to a client at one of its versions, or the outputs of the session at one of its
+    versions if client_id is None, so that later updates can be diffed against them.
+    """
+
+    if output is not None:
+        key = (session_key, get_model_version(), int(version)) if client_id is None else (session_key, get_model_version(), str(client_id), int(version))
+        current_app.config['session_traces'].put(key, output)
+
+def parse_view(max_points: int = None, x_range: list = None, method: str = None):
+    """
+    Builds level-of-detail settings for traces from request data, falling back to the defaults of the current app.
+
+    Parameters:
+        max_points (int): Target number of points per trace, e.g. the pixel width of the plot.
+        x_range (list): Visible [min, max] range of the independent variable.
+        method (str): Downsampling method, either lttb or minmax.
+    """
+
+    max_points = max_points or current_app.config.get('max_points')
+    return {
+        'max_points': int(max_points) if max_points else None,
+        'x_range': [float(x_range[0]), float(x_range[1])] if x_range else None,
+        'method': method or current_app.config.get('downsample', 'lttb')
+    }
+
+def reduce_traces(model: Model, traces: list, view: dict):
+    """
+    Restricts traces of the form {'y', ...} to the visible range and downsamples them, adding the matching
+    independent variable values to each trace. Only models with one independent variable are reduced.
+    """
+
+    x = model.independent_variable_collection.get_value_arrays(aslist=False)
+    if len(x) != 1 or (view['max_points'] is None and view['x_range'] is None):
+        return traces
+
+    for trace_data in traces:
+        trace_data['x'], trace_data['y'] = reduce_trace(x[0], trace_data['y'], max_points=view['max_points'], x_range=view['x_range'], method=view['method'])
+    return traces
+
+def build_plot_data(model: Model, output: np.ndarray, view: dict = None):
+    """
+    Builds traces and layout for plotting model outputs. If view is given, traces are reduced to its level of detail.
+    """
+
+    x = model.independent_variable_collection.get_value_arrays(aslist=False)
     x = x[0] if len(x) == 1 else x
-    xlabel = current_app.config['model'].independent_variable_collection.get_names()
-    xlabel = xlabel[0] if len(x) == 1 else xlabel
 
     # generate the layout for independent variables
-    assert len(current_app.config['model'].independent_variable_collection.get_value_arrays()) < 3, 'LocalServerError: Only can plot functions with a maximum of two independent variables!'
-    layout = {'title': current_app.config['model'].name}
-    for index, name in enumerate(current_app.config['model'].independent_variable_collection.get_names()):
+    assert len(model.independent_variable_collection.get_value_arrays(aslist=False)) < 3, 'LocalServerError: Only can plot functions with a maximum of two independent variables!'
+    layout = {'title': model.name}
+    for index, name in enumerate(model.independent_variable_collection.get_names()):
         axis = 'xaxis' if index == 0 else 'yaxis'
         layout[axis] = {'title': name, 'aspectratio': 1}
 
+    # surfaces are sent as their two axis vectors and a matrix of values, never as a mesh
+    surface_type = current_app.config.get('surface_type', 'surface') if has_app_context() else 'surface'
+    if model.surface and surface_type == 'surface':
+        layout['scene'] = {'xaxis': {'title': layout.pop('xaxis')['title']}, 'yaxis': {'title': layout.pop('yaxis')['title']}, 'zaxis': {'title': model.name}}
+
     # generate data for traces and layout for model prediction(s)
     traces = []
-    for index, trace in enumerate(current_app.config['model'].evaluate()):
+    for index, trace in enumerate(output if output is not None else []):
 
-        trace_data = {'type': 'scatter', 'mode': 'lines','x': x, 'y': trace}
-        name = None if len(current_app.config['model'].prediction_names) <= index else current_app.config['model'].prediction_names[index]
+        if model.surface:
+            trace_data = {'type': surface_type, 'x': x[0], 'y': x[1], 'z': trace}
+        else:
+            trace_data = {'type': 'scatter', 'mode': 'lines','x': x, 'y': trace}
+        name = None if len(model.prediction_names) <= index else model.prediction_names[index]
 
         if name:
             trace_data['name'] = name
         
         traces.append(trace_data)
 
-    current_app.config['plot_data']['traces'] = traces
     axis = 'yaxis' if axis == 'xaxis' else 'zaxis'
-    layout['axis'] = {'title': current_app.config['model'].name, 'aspectratio': 1}
-    current_app.config['plot_data']['layout'] = layout
+    layout['axis'] = {'title': model.name, 'aspectratio': 1}
+
+    if view:
+        traces = reduce_traces(model, traces, view)
+
+    return {'traces': traces, 'layout': layout}
 
-    return jsonify(current_app.config['plot_data'])
+def has_bands(model: Model):
+    return model.parameter_collection.is_uncertain() and not model.surface
+
+def get_uncertainty_options():
+    return dict(DEFAULT_UNCERTAINTY_OPTIONS, **current_app.config.get('uncertainty_options', {}))
+
+def build_band_traces(model: Model, result: dict, view: dict = None):
+    """
+    Builds a pair of traces per prediction from the bands of propagate_uncertainty: a lower edge, and an upper
+    edge filled down to it. Band traces are tagged by their meta attribute, so clients can find them among others.
+    If view is given, edges are reduced to its level of detail.
+    """
+
+    x = model.independent_variable_collection.get_value_arrays(aslist=False)[0]
+    traces = []
+    for index in range(result['bands'].shape[1]):
+        name = model.prediction_names[index] if index < len(model.prediction_names) else f'prediction {index}'
+        for edge, percentile, fill in [('lower', result['percentiles'][0], 'none'), ('upper', result['percentiles'][1], 'tonexty')]:
+            traces.append({
+                'type': 'scatter', 'mode': 'lines', 'x': x, 'y': result['bands'][0 if edge == 'lower' else 1, index],
+                'name': f'{name} ({percentile:g}th percentile)', 'line': {'width': 0}, 'fill': fill, 'showlegend': False,
+                'meta': {'band': edge, 'prediction': index, 'samples': result['samples']}
+            })
+
+    return reduce_traces(model, traces, view) if view else traces
+
+def build_sensitivity_data(model: Model, jacobian: np.ndarray, include_jacobian: bool = False):
+    """
+    Summarizes derivatives of model outputs (see Model.sensitivity) as a matrix with a row per prediction and a
+    column per parameter. Entries are the root mean square change of a prediction over its points when a parameter
+    moves across its whole slider range, so parameters of different units can be compared.
+    """
+
+    ranges = np.array([slider_data['max'] - slider_data['min'] for slider_data in model.slider_data], dtype=float)
+    scaled = jacobian.reshape(jacobian.shape[:2] + (-1,)) * ranges[:, np.newaxis, np.newaxis]
+    matrix = np.sqrt(np.mean(np.square(scaled), axis=2)).T
+
+    prediction_names = [model.prediction_names[index] if index < len(model.prediction_names) else f'prediction {index}' for index in range(len(matrix))]
+    sensitivity_data = {'parameters': model.parameter_collection.get_names(), 'predictions': prediction_names, 'matrix': matrix}
+    if include_jacobian:
+        sensitivity_data['jacobian'] = jacobian
+    return sensitivity_data
+
+# Report models that cannot be loaded, instead of exiting
+@template.errorhandler(ModelLoadError)
+def handle_model_load_error(error):
+    return jsonify({'error': str(error)}), 503
+
+# route for listing the models served by a registry
+def serve_model_index():
+    registry = current_app.config['registry']
+    models = []
+    for key in registry.keys():
+        entry = registry.entries[key]
+        models.append({'key': key, 'name': entry.model.name if entry.model else key, 'error': str(entry.error) if entry.error else None, 'loaded': entry.loaded.is_set()})
+    return render_template('models.html', models=models)
+
+# route for serving static content
+@template.route('/')
+def serve_static_content():
+    return make_conditional_response(make_response(render_template('index.html', model_name=get_model().name, streaming=current_app.config.get('streaming', True))))
+
+# route for handling slider data requests
+@template.route('/serve_slider_data', methods=['GET'])
+def serve_slider_data():
+
+    # slider positions start from the parameter values of the session, and can be reset to those of the model
+    model = get_model()
+    parameters = get_session_parameters(model)
+    slider_data = [dict(item, initial_value=parameters[item['name']], default_value=item['initial_value']) for item in model.slider_data]
+
+    return make_conditional_response(jsonify(slider_data))
+
+# route for handling plot data requests
+@template.route('/serve_plot_data', methods=['GET'])
+def serve_plot_data():
+
+    model, session_key = get_model(), get_session_key()
+    output, _, status = update_traces(model, session_key, get_session_parameters(model))
+    view = parse_view(request.args.get('max_points'), method=request.args.get('downsample'))
+    version = session.get(session_field('version'), 0)
+    plot_data = dict(build_plot_data(model, output, view=view), status=status, version=version, model_version=get_model_version())
+
+    # later updates of pages are diffed against these outputs; they are kept for the session rather than for a
+    # client, so that the URL, and with it conditional requests for the initial plot data, are the same for every page
+    if status == 'ok':
+        put_client_output(session_key, None, version, output)
+
+    # band traces start as zero-width bands at the outputs, and are estimated over /stream_bands, in the pool of fits
+    if has_bands(model) and output is not None:
+        level = get_uncertainty_options()['level']
+        placeholder = {'samples': 0, 'percentiles': (50 * (1 - level), 50 * (1 + level)), 'bands': np.stack([output, output])}
+        plot_data['traces'] += build_band_traces(model, placeholder, view)
+
+    response = make_payload_response(plot_data, binary=request.args.get('format') == 'binary', dtype=request.args.get('dtype', 'float64'), model=model)
+    return make_conditional_response(response) if status == 'ok' else response
+
+# route for handling full resolution requests for a range of the independent variable
+@template.route('/serve_range_data', methods=['GET'])
+def serve_range_data():
+
+    model, session_id = get_model(), get_session_key()
+    x_range = [request.args['xmin'], request.args['xmax']] if 'xmin' in request.args and 'xmax' in request.args else None
+    view = parse_view(request.args.get('max_points'), x_range, request.args.get('downsample'))
+    binary, dtype = request.args.get('format') == 'binary', request.args.get('dtype', 'float64')
+    if is_model_outdated(request.args.get('model_version')):
+        return make_payload_response({'traces': [], 'status': 'reload'}, binary=binary, dtype=dtype)
+
+    # the last good outputs of the session are reused, so zooming does not require evaluations
+    output, status = current_app.config['session_traces'].get((session_id, get_model_version())), 'ok'
+    if output is None:
+        output, _, status = update_traces(model, session_id, get_session_parameters(model))
+
+    traces = [{'index': index, get_trace_key(model): trace} for index, trace in enumerate(output if output is not None else [])]
+    traces = reduce_traces(model, traces, view)
+
+    return make_payload_response({'traces': traces, 'status': status}, binary=binary, dtype=dtype)
 
 # route for handling update requests
 @template.route('/update_plot_data', methods=['POST'])
@@ -90,18 +470,356 @@ def update_plot_data():
     data = request.json
     param_name = str(data['paramName'])
     param_value = float(data['paramValue'])
-    current_app.config['model'].update_parameter(param_name, param_value)
 
-    for index, trace in enumerate(current_app.config['model'].evaluate()):
-        current_app.config['plot_data']['traces'][index]['y'] = trace
+    model = get_model()
+    parameters = get_session_parameters(model)
+    assert param_name in parameters, f'LocalServerError: Unknown parameter {param_name}.'
+    parameters[param_name] = param_value
+    set_session_parameters(parameters)
+
+    # unversioned updates cannot be diffed against what the client displays, so every trace is sent
+    output, changed_traces, status = update_traces(model, get_session_key(), parameters)
+
+    view = parse_view(data.get('maxPoints'), data.get('xRange'), data.get('downsample'))
+    if data.get('format') == 'binary':
+        return make_payload_response({'traces': reduce_traces(model, changed_traces, view), 'status': status}, binary=True, dtype=data.get('dtype', 'float64'))
+    return make_payload_response(dict(build_plot_data(model, output, view=view), status=status), model=model)
+
+# route for applying parameter vectors
+@template.route('/update_parameters', methods=['POST'])
+def update_parameters():
+
+    data = request.json
+    model = get_model()
+    parameters = get_session_parameters(model)
+
+    # validate the whole vector before applying any of it
+    unknown_names = set(data['parameters']).difference(parameters)
+    if unknown_names:
+        return jsonify({'error': f'Unknown parameters: {sorted(unknown_names)}.'}), 400
+
+    # versions order updates of a session; clients may tag updates with their own increasing versions, and are
+    # told the newest version of the session when another page of it got ahead
+    latest_version = session.get(session_field('version'), 0)
+    version = int(data['version']) if 'version' in data else latest_version + 1
+    if version <= latest_version:
+        return make_payload_response({'version': version, 'latest_version': latest_version, 'traces': [], 'status': 'stale'}, binary=data.get('format') == 'binary', dtype=data.get('dtype', 'float64'))
+
+    parameters.update((str(param_name), float(param_value)) for param_name, param_value in data['parameters'].items())
+    set_session_parameters(parameters)
+    session[session_field('version')] = version
+
+    # clients of a reloaded model refetch every trace, and the layout, from /serve_plot_data
+    if is_model_outdated(data.get('modelVersion')):
+        return make_payload_response({'version': version, 'traces': [], 'status': 'reload'}, binary=data.get('format') == 'binary', dtype=data.get('dtype', 'float64'))
+
+    # only traces that changed since the version the client last applied are sent, if this process still holds
+    # the outputs of that version; otherwise every trace is sent
+    session_key, client_id = get_session_key(), data.get('client')
+    base_output = get_client_output(session_key, client_id, data.get('baseVersion'))
+    output, changed_traces, status = update_traces(model, session_key, parameters, base_output=base_output)
+    if status == 'ok':
+        put_client_output(session_key, client_id, version, output)
+    changed_traces = reduce_traces(model, changed_traces, parse_view(data.get('maxPoints'), data.get('xRange'), data.get('downsample')))
 
-    return jsonify(current_app.config['plot_data'])
+    return make_payload_response({'version': version, 'traces': changed_traces, 'status': status}, binary=data.get('format') == 'binary', dtype=data.get('dtype', 'float64'))
 
-def launch_interactive(model: Model):
+# route for handling sensitivity requests, at the parameter values of the session
+@template.route('/serve_sensitivity_data', methods=['GET'])
+def serve_sensitivity_data():
 
-    app = Flask(__name__, static_url_path='/static', template_folder='./templates')
-    app.config['model_file'], app.config['model'], app.config['plot_data'] = None, model, {}
+    model = get_model()
+    method = request.args.get('method', 'central')
+    if method not in SENSITIVITY_METHODS:
+        return jsonify({'error': f'Unknown method: {method}. Expected one of {SENSITIVITY_METHODS}.'}), 400
+
+    # all perturbed parameter sets are evaluated in one batch, in the evaluation pool; sensitivities have their own
+    # session key, so that they supersede earlier sensitivities of the session, but never its trace updates
+    with timed('evaluate'):
+        jacobian, status = get_evaluation_pool().evaluate(f'{get_session_key()}.sensitivity', model, get_session_parameters(model), model_file=get_model_file(), method=method)
+
+    # models that cannot take complex steps say so, rather than returning zero sensitivities
+    if status == 'error' and isinstance(jacobian, TypeError):
+        return jsonify({'error': str(jacobian), 'status': status}), 400
+    if status == 'error':
+        return jsonify({'error': f'Sensitivities could not be computed with the {method} method.', 'status': status}), 500
+    if status != 'ok':
+        return jsonify({'error': f'Sensitivities were not computed ({status}).', 'status': status}), 503
+
+    sensitivity_data = build_sensitivity_data(model, jacobian, include_jacobian=request.args.get('jacobian') == 'true')
+    return make_payload_response(dict(sensitivity_data, status='ok'), binary=request.args.get('format') == 'binary', dtype=request.args.get('dtype', 'float64'))
+
+# route for streaming plot updates to a client over server-sent events
+@template.route('/stream_plot_data', methods=['GET'])
+def stream_plot_data():
+
+    channel_id = str(request.args['channel'])
+    dtype = request.args.get('dtype', 'float64')
+    session_id, channels = get_session_key(), current_app.config['channels']
+
+    # a reconnecting client replaces its previous channel
+    channel = UpdateChannel()
+    with _channels_lock:
+        previous_channel = channels.get(channel_id)
+        channels[channel_id] = channel
+    if previous_channel:
+        previous_channel.close()
+
+    def generate_events():
+
+        # frames are applied in order, so each one is diffed against the last good outputs sent on this stream
+        base_output = None
+        try:
+            while True:
+                pending = channel.take(timeout=STREAM_KEEPALIVE)
+                if channel.closed:
+                    break
+                if pending is None:
+                    yield ': keepalive\n\n'
+                    continue
+
+                # only the newest pending parameter vector is evaluated, and each frame is timed separately
+                g.timer = RequestTimer()
+                sequence, update = pending
+
+                # models may be reloaded while a stream is open; clients of a previous version refetch every trace
+                model = get_model()
+                if is_model_outdated(update['model_version']):
+                    base_output = None
+                    frame = base64.b64encode(to_binary({'sequence': sequence, 'traces': [], 'status': 'reload'}, dtype=dtype)).decode('ascii')
+                    yield f'id: {sequence}\ndata: {frame}\n\n'
+                    continue
+
+                output, changed_traces, status = update_traces(model, session_id, update['parameters'], base_output=base_output)
+                if status == 'ok':
+                    base_output = output
+                changed_traces = reduce_traces(model, changed_traces, update['view'])
+
+                with timed('serialize'):
+                    frame = base64.b64encode(to_binary({'sequence': sequence, 'traces': changed_traces, 'status': status}, dtype=dtype)).decode('ascii')
+                record_timings('/stream_plot_data', g.timer)
+                yield f'id: {sequence}\ndata: {frame}\n\n'
+        finally:
+            with _channels_lock:
+                if channels.get(channel_id) is channel:
+                    del channels[channel_id]
+
+    return Response(stream_with_context(generate_events()), mimetype='text/event-stream', headers={'X-Accel-Buffering': 'no'})
+
+# route for submitting parameter vectors to an update stream
+@template.route('/submit_parameters', methods=['POST'])
+def submit_parameters():
+
+    data = request.json
+    channel = current_app.config['channels'].get(str(data['channel']))
+    if channel is None:
+        return jsonify({'accepted': False, 'error': 'Unknown or closed channel.'}), 404
+
+    # the session keeps the newest parameter vector, since the stream cannot set cookies
+    parameters = get_session_parameters(get_model())
+    parameters.update((str(param_name), float(param_value)) for param_name, param_value in data['parameters'].items() if param_name in parameters)
+    view = parse_view(data.get('maxPoints'), data.get('xRange'), data.get('downsample'))
+    accepted = channel.submit(int(data['sequence']), {'parameters': parameters, 'view': view, 'model_version': data.get('modelVersion')})
+    if accepted:
+        set_session_parameters(parameters)
+        session[session_field('version')] = int(data['sequence'])
+
+    return jsonify({'accepted': accepted})
+
+# route for reading uploaded measurements, which clients send back with fit requests
+@template.route('/upload_data', methods=['POST'])
+def upload_data():
+
+    model = get_model()
+    if 'file' in request.files:
+        file = request.files['file']
+        text, format = file.read().decode('utf-8'), 'json' if file.filename.lower().endswith('.json') else 'csv'
+    else:
+        text, format = request.get_data(as_text=True), 'json' if request.is_json else 'csv'
+
+    try:
+        data = read_data(text, model, format=request.args.get('format', format))
+    except (ValueError, KeyError, AssertionError) as error:
+        return jsonify({'error': f'Data could not be read: {error}'}), 400
+
+    return make_payload_response(data.to_dict())
+
+# route for fitting parameters to measurements, streaming the best parameters found so far
+@template.route('/fit_parameters', methods=['POST'])
+def fit_parameters():
+
+    data = request.json
+    model, parameters = get_model(), get_session_parameters(get_model())
+    try:
+        fit_data = FitData(data['data']['x'], data['data']['y'], data['data'].get('predictions'))
+    except (ValueError, KeyError, AssertionError) as error:
+        return jsonify({'error': f'Invalid data: {error}'}), 400
+
+    # process pools read the model from its file, so models without one are fitted in threads
+    fit_pool_options = current_app.config.get('fit_pool_options', {})
+    model_file = get_model_file() if fit_pool_options.get('kind', 'process') == 'process' else None
+    executor = get_fit_executor('process' if model_file else 'thread')
+    fit_options = {
+        'starts': int(data.get('starts', 8)),
+        'max_iterations': int(data.get('maxIterations', 100)),
+        'seed': int(data.get('seed', 0)),
+        'initial_parameters': parameters,
+        'executor': executor,
+        'model_file': model_file
+    }
+
+    # the fit runs beside the response, and only the newest progress report is sent
+    channel, stop = UpdateChannel(), threading.Event()
+    def run_fit():
+        sequence = 0
+        def progress(result):
+            nonlocal sequence
+            sequence += 1
+            channel.submit(sequence, dict(result, done=False))
+        try:
+            result = fit_model(model, fit_data, progress=progress, stop=stop, **fit_options)
+            channel.submit(sequence + 1, dict(result, done=True))
+        except Exception as error:
+            traceback.print_exc()
+            channel.submit(sequence + 1, {'error': str(error), 'done': True})
+    threading.Thread(target=run_fit, daemon=True).start()
+
+    def generate_events():
+        try:
+            while True:
+                pending = channel.take(timeout=STREAM_KEEPALIVE)
+                if pending is None:
+                    yield ': keepalive\n\n'
+                    continue
+                sequence, update = pending
+                yield f'id: {sequence}\ndata: {json.dumps(update)}\n\n'
+                if update['done']:
+                    break
+        finally:
+            stop.set()
+
+    return Response(stream_with_context(generate_events()), mimetype='text/event-stream', headers={'X-Accel-Buffering': 'no'})
+
+# route for streaming uncertainty bands, refined as the number of samples grows
+@template.route('/stream_bands', methods=['GET'])
+def stream_bands():
+
+    model = get_model()
+    if not has_bands(model):
+        return jsonify({'error': 'The model has no uncertain parameters, or is a surface.'}), 400
+    x_range = [request.args['xmin'], request.args['xmax']] if 'xmin' in request.args and 'xmax' in request.args else None
+    view = parse_view(request.args.get('max_points'), x_range, request.args.get('downsample'))
+    dtype, options = request.args.get('dtype', 'float64'), get_uncertainty_options()
+
+    # chunks run in the pool of fits, and only the newest bands are sent
+    fit_pool_options = current_app.config.get('fit_pool_options', {})
+    model_file = get_model_file() if fit_pool_options.get('kind', 'process') == 'process' else None
+    uncertainty_options = {
+        'samples': int(request.args.get('samples', options['samples'])),
+        'chunk_size': options['chunk_size'],
+        'level': options['level'],
+        'executor': get_fit_executor('process' if model_file else 'thread'),
+        'model_file': model_file
+    }
+
+    channel, stop = UpdateChannel(), threading.Event()
+    def run_sampling(parameters: dict):
+        sequence = 0
+        def progress(result):
+            nonlocal sequence
+            sequence += 1
+            channel.submit(sequence, dict(result, done=False))
+        try:
+            result = propagate_uncertainty(model, parameters, progress=progress, stop=stop, **uncertainty_options)
+            channel.submit(sequence + 1, dict(result, done=True))
+        except Exception as error:
+            traceback.print_exc()
+            channel.submit(sequence + 1, {'error': str(error), 'done': True})
+    threading.Thread(target=run_sampling, args=(get_session_parameters(model),), daemon=True).start()
+
+    def generate_events():
+        try:
+            while True:
+                pending = channel.take(timeout=STREAM_KEEPALIVE)
+                if pending is None:
+                    yield ': keepalive\n\n'
+                    continue
+                sequence, update = pending
+                if 'error' in update:
+                    payload = {'error': update['error'], 'done': True}
+                else:
+                    payload = {'samples': update['samples'], 'traces': build_band_traces(model, update, view), 'done': update['done']}
+                frame = base64.b64encode(to_binary(payload, dtype=dtype)).decode('ascii')
+                yield f'id: {sequence}\ndata: {frame}\n\n'
+                if update['done']:
+                    break
+        finally:
+            stop.set()
+
+    return Response(stream_with_context(generate_events()), mimetype='text/event-stream', headers={'X-Accel-Buffering': 'no'})
+
+# route for exposing metrics in the Prometheus text format
+@template.route('/metrics', methods=['GET'])
+def serve_metrics():
+    return Response(current_app.config['metrics'].render(), content_type=PROMETHEUS_MIMETYPE)
+
+def create_app(model: Model = None, model_file: str = None, model_directory: str = None, evaluation_pool_options: dict = {}, streaming: bool = True, max_points: int = None, downsample: str = 'lttb', surface_type: str = 'surface', fit_pool_options: dict = {}, disk_cache_options: dict = {}, uncertainty_options: dict = {}):
+    """
+    Builds an app serving a model, or every model in a directory under its own URL prefix. Parameter values
+    are kept per session, so models themselves are never modified by requests.
+
+    Parameters:
+        model (Model): The model to serve. If None, the model is read from model_file on first use.
+        model_file (str): Path to the input model.
+        model_directory (str): Directory of model files to serve through a ModelRegistry, each under /<file name>/.
+            Models are read into memory on first use, unless loaded beforehand with ModelRegistry.load_all.
+        evaluation_pool_options (dict): Keyword arguments for the EvaluationPool of each worker process.
+        streaming (bool): Whether clients stream updates over /stream_plot_data. Update streams are kept
+            in memory, so they must be disabled when serving from multiple worker processes.
+        max_points (int): Default number of points per trace, for clients that do not request a level of detail.
+        downsample (str): Default downsampling method, either lttb or minmax.
+        surface_type (str): Plotly trace type of models of two independent variables, either surface or heatmap.
+        fit_pool_options (dict): Kind (thread or process) and max_workers of the executor running multi-start fits.
+        disk_cache_options (dict): Directory and max_bytes of a disk cache (see Model.enable_disk_cache) shared by
+            served models and evaluation pool workers. Models that enable a disk cache themselves keep their own.
+        uncertainty_options (dict): Number of samples of the final estimates of uncertainty bands, the chunk_size
+            they are evaluated in, and the probability mass (level) within bands.
+    """
+
+    assert surface_type in SURFACE_TYPES, f'LocalServerError: surface_type must be one of {SURFACE_TYPES}.'
+
+    app = Flask(__name__, static_url_path='/static', static_folder=os.path.join(ROOT_DIRECTORY, 'static'), template_folder=os.path.join(ROOT_DIRECTORY, 'templates'))
+    app.config['model_file'], app.config['model'] = model_file, model
+    app.config['evaluation_pool_options'], app.config['streaming'] = evaluation_pool_options, streaming
+    app.config['channels'], app.config['session_traces'] = {}, EvaluationCache(max_entries=SESSION_TRACES_SIZE)
+    app.config['max_points'], app.config['downsample'] = max_points, downsample
+    app.config['surface_type'] = surface_type
+    app.config['fit_pool_options'], app.config['fit_executors'] = fit_pool_options, {}
+    app.config['disk_cache_options'] = disk_cache_options
+    app.config['uncertainty_options'] = uncertainty_options
+    app.config['metrics'] = MetricsRegistry()
+    app.config['metrics'].describe('model_playground_request_phase_seconds', 'Time spent in phases (evaluate, serialize, total) of handling requests.')
+    app.config['metrics'].describe('model_playground_requests_total', 'Number of handled requests.')
+    app.config['metrics'].describe('model_playground_evaluations_total', 'Number of model evaluations, by status.')
+    app.config['SECRET_KEY'] = os.urandom(24)
+
+    # static assets are requested by content hash, and cached until they change
+    app.url_defaults(add_static_version)
+    app.after_request(add_static_cache_headers)
 
     # register route handling functions
-    app.register_blueprint(template)
-    app.run()
\ No newline at end of file
+    if model_directory:
+        app.config['registry'] = ModelRegistry(model_directory)
+        for model_key in app.config['registry'].keys():
+            app.register_blueprint(template, url_prefix=f'/{model_key}', name=model_key)
+        app.add_url_rule('/', 'serve_model_index', serve_model_index)
+        app.add_url_rule('/metrics', 'serve_metrics', serve_metrics)
+    else:
+        app.register_blueprint(template)
+    return app
+
+def launch_interactive(model: Model, pool_size: int = None, evaluation_timeout: float = None):
+
+    evaluation_pool_options = dict([(key, value) for key, value in [('max_workers', pool_size), ('timeout', evaluation_timeout)] if value])
+    app = create_app(model=model, evaluation_pool_options=evaluation_pool_options)
+    app.run(threaded=True)
@@ -0,0 +1,63 @@
+import os
+import shutil
+import signal
+import socket
+import tempfile
+from flask import Flask
+from werkzeug.serving import make_server
+
+def run_workers(app: Flask, host: str = '127.0.0.1', port: int = 5000, workers: int = 1):
+    """
+    Serves an app from pre-forked worker processes sharing one listening socket. Each worker handles
+    requests on multiple threads. Anything loaded into the app before calling this function (e.g. the
+    model) is loaded once and inherited by every worker. Metrics of the app (app.config['metrics']) are
+    shared between workers through a temporary directory, so /metrics reports all workers together.
+
+    Parameters:
+        app (Flask): The app to serve.
+        host (str): Hostname to listen on.
+        port (int): Port to listen on.
+        workers (int): Number of worker processes.
+    """
+
+    assert workers > 0, 'Server Error: workers must be a positive integer.'
+    if workers == 1 or not hasattr(os, 'fork'):
+        app.run(host=host, port=port, threaded=True)
+        return
+
+    listener = socket.socket(socket.AF_INET6 if ':' in host else socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind((host, port))
+    listener.listen(socket.SOMAXCONN)
+    listener.set_inheritable(True)
+    print(f' * Serving {app.name} on http://{host}:{port} with {workers} worker processes')
+
+    metrics_directory = tempfile.mkdtemp(prefix='model_playground_metrics_')
+    if app.config.get('metrics'):
+        app.config['metrics'].share(metrics_directory)
+
+    worker_pids = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            server = make_server(host, port, app, threaded=True, fd=listener.fileno())
+            server.serve_forever()
+            os._exit(0)
+        worker_pids.append(pid)
+
+    # workers are stopped along with the parent process
+    def stop_workers(signum, frame):
+        raise KeyboardInterrupt
+    signal.signal(signal.SIGTERM, stop_workers)
+
+    try:
+        for pid in worker_pids:
+            os.waitpid(pid, 0)
+    except KeyboardInterrupt:
+        for pid in worker_pids:
+            os.kill(pid, signal.SIGTERM)
+    finally:
+        listener.close()
+        shutil.rmtree(metrics_directory, ignore_errors=True)
@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+Evaluates a model over a large set of parameter vectors, outside the browser. Results are written chunk by chunk
+into memory-mapped .npy files, so sweeps larger than memory work, and interrupted sweeps resume from the last
+completed chunk.
+
+Usage:
+    python -m model_playground.sweep --model-file examples/linear_model.py --output sweep/ --method grid --parameters m b=0:5 --points 100
+    python -m model_playground.sweep --model-file examples/linear_model.py --output sweep/ --method lhs --samples 100000
+    python -m model_playground.sweep --model-file examples/linear_model.py --output sweep/ --spec spec.json
+
+A sweep directory holds parameters.npy (N, number of parameters), outputs.npy (N, number of predictions, ...),
+sweep.json describing the sweep, and progress.txt listing completed chunks.
+"""
+
+import os
+import sys
+import json
+import hashlib
+import argparse
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from .model import Model
+from .pool import get_worker_model
+from .registry import exec_model_file, ModelLoadError
+
+SWEEP_METHODS = ('grid', 'lhs')
+SCALES = ('linear', 'log')
+DEFAULT_CHUNK_SIZE = 1024
+FEISTEL_ROUNDS = 4 # rounds of the permutations placing Latin hypercube rows
+MASK64 = (1 << 64) - 1
+
+def parse_parameter(token: str, model: Model):
+    """
+    Parses a swept parameter of the form name or name=min:max into a range, taking missing bounds from the
+    parameter collection.
+    """
+
+    name, _, bounds = token.partition('=')
+    names = model.parameter_collection.get_names()
+    assert name in names, f'Sweep Error: unknown parameter {name}. Expected one of {names}.'
+    index = names.index(name)
+    lower_bound, upper_bound = model.parameter_collection.get_lower_bounds()[index], model.parameter_collection.get_upper_bounds()[index]
+    if bounds:
+        lower_bound, upper_bound = [float(bound) for bound in bounds.split(':')]
+    return name, {'min': float(lower_bound), 'max': float(upper_bound)}
+
+def build_spec(model: Model, method: str = 'grid', parameters: list = None, points: int = 10, samples: int = 1000, log: list = [], seed: int = 0):
+    """
+    Builds a sweep specification from command line arguments. Parameters default to all parameters of the model,
+    over the bounds of the parameter collection; parameters that are not swept keep their initial values.
+    """
+
+    parameters = parameters or model.parameter_collection.get_names()
+    ranges = dict([parse_parameter(token, model) for token in parameters])
+    for name, parameter_range in ranges.items():
+        parameter_range['scale'] = 'log' if name in log else 'linear'
+        if method == 'grid':
+            parameter_range['num'] = points
+    spec = {'method': method, 'parameters': ranges, 'seed': seed}
+    if method == 'lhs':
+        spec['samples'] = samples
+    return spec
+
+def _scale_values(unit_values: np.ndarray, parameter_range: dict):
+    """
+    Maps values in [0, 1] onto a parameter range, evenly on a linear or log scale.
+    """
+
+    lower_bound, upper_bound = parameter_range['min'], parameter_range['max']
+    if parameter_range.get('scale', 'linear') == 'log':
+        return np.exp(np.log(lower_bound) + unit_values * (np.log(upper_bound) - np.log(lower_bound)))
+    return lower_bound + unit_values * (upper_bound - lower_bound)
+
+def check_spec(spec: dict, model: Model):
+    """
+    Ensures a sweep specification is complete before any file is written.
+    """
+
+    assert spec.get('method') in SWEEP_METHODS, f'Sweep Error: method must be one of {SWEEP_METHODS}.'
+    assert len(spec.get('parameters', {})) > 0, 'Sweep Error: at least one swept parameter is required.'
+    assert spec['method'] == 'grid' or spec.get('samples', 0) > 0, 'Sweep Error: Latin hypercube sweeps require a positive number of samples.'
+    for name, parameter_range in spec['parameters'].items():
+        assert name in model.parameter_collection.get_names(), f'Sweep Error: unknown parameter {name}.'
+        assert 'min' in parameter_range and 'max' in parameter_range, f'Sweep Error: the range of {name} requires min and max.'
+        assert parameter_range.get('scale', 'linear') in SCALES, f'Sweep Error: scales must be one of {SCALES}.'
+        assert parameter_range.get('scale', 'linear') == 'linear' or (parameter_range['min'] > 0 and parameter_range['max'] > 0), f'Sweep Error: the log scaled range of {name} must be positive.'
+        assert spec['method'] == 'lhs' or parameter_range.get('num', 0) > 0, f'Sweep Error: the grid of {name} requires a positive number of points.'
+
+def count_rows(spec: dict):
+    if spec['method'] == 'grid':
+        return int(np.prod([parameter_range['num'] for parameter_range in spec['parameters'].values()]))
+    return int(spec['samples'])
+
+def _mix(values: np.ndarray, key: int):
+    """
+    Private function hashing unsigned 64 bit integers, seeded by key, with the finalizer of splitmix64.
+    """
+
+    values = values + np.uint64((key * 0x9E3779B97F4A7C15) & MASK64)
+    values = (values ^ (values >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    values = (values ^ (values >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return values ^ (values >> np.uint64(31))
+
+def _permute(indices: np.ndarray, size: int, key: int):
+    """
+    Private function mapping indices through a pseudorandom permutation of range(size), seeded by key, without
+    building the permutation. A Feistel network permutes the smallest even power of two covering size, and values
+    that land outside range(size) are permuted again until they land inside it.
+    """
+
+    half_bits = -(-max(size - 1, 1).bit_length() // 2)
+    mask = np.uint64((1 << half_bits) - 1)
+    values = np.asarray(indices, dtype=np.uint64).copy()
+    outside = np.ones(len(values), dtype=bool)
+    while outside.any():
+        left, right = values[outside] >> np.uint64(half_bits), values[outside] & mask
+        for round in range(FEISTEL_ROUNDS):
+            left, right = right, left ^ (_mix(right, key * FEISTEL_ROUNDS + round) & mask)
+        values[outside] = (left << np.uint64(half_bits)) | right
+        outside = values >= np.uint64(size)
+    return values.astype(np.int64)
+
+def latin_hypercube_rows(start: int, stop: int, no_rows: int, no_dimensions: int, seed: int = 0):
+    """
+    Builds rows start to stop of a Latin hypercube sample of no_rows rows, without building the other rows. In
+    each dimension, a permutation of the rows seeded by seed assigns every row its own 1 / no_rows interval, and
+    a hash of the row index places it within the interval. Rows are the same however a sample is split up.
+    """
+
+    indices = np.arange(start, stop, dtype=np.uint64)
+    samples = np.empty((stop - start, no_dimensions))
+    with np.errstate(over='ignore'):
+        for dimension in range(no_dimensions):
+            key = (seed * no_dimensions + dimension) * 2
+            intervals = _permute(indices, no_rows, key)
+            offsets = (_mix(indices, key + 1) >> np.uint64(11)) * 2.0 ** -53
+            samples[:, dimension] = (intervals + offsets) / no_rows
+    return samples
+
+def hash_model_file(model_file: str):
+    """
+    Returns a hash of the contents of a model file, so that sweeps are not resumed with an edited model. Modules
+    imported by the model file are not hashed.
+    """
+
+    with open(model_file, 'rb') as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+def build_parameters(model: Model, spec: dict, start: int, stop: int):
+    """
+    Builds rows start to stop of the parameter matrix of a sweep. Rows are computed from their index, so neither
+    grids nor Latin hypercube samples are ever held in memory.
+    """
+
+    names = model.parameter_collection.get_names()
+    initial_values = model.get_parameters()
+    rows = np.tile(np.array([float(initial_values[name]) for name in names]), (stop - start, 1))
+
+    swept = list(spec['parameters'].items())
+    if spec['method'] == 'grid':
+        nums = [parameter_range['num'] for _, parameter_range in swept]
+        grid_indices = np.unravel_index(np.arange(start, stop), nums)
+        for (name, parameter_range), grid_index, num in zip(swept, grid_indices, nums):
+            rows[:, names.index(name)] = _scale_values(grid_index / max(num - 1, 1), parameter_range)
+    else:
+        unit_samples = latin_hypercube_rows(start, stop, count_rows(spec), len(swept), spec.get('seed', 0))
+        for column, (name, parameter_range) in enumerate(swept):
+            rows[:, names.index(name)] = _scale_values(unit_samples[:, column], parameter_range)
+    return rows
+
+def _evaluate_chunk(model_file: str, directory: str, chunk: int, chunk_size: int):
+    """
+    Evaluates one chunk of a sweep in a worker process, writing outputs directly into the memory-mapped output file.
+    """
+
+    parameters = np.load(os.path.join(directory, 'parameters.npy'), mmap_mode='r')
+    outputs = np.load(os.path.join(directory, 'outputs.npy'), mmap_mode='r+')
+    start, stop = chunk * chunk_size, min((chunk + 1) * chunk_size, len(parameters))
+    with np.errstate(all='ignore'):
+        outputs[start:stop] = get_worker_model(model_file).evaluate_batch(parameters[start:stop], chunk_size=chunk_size)
+    outputs.flush()
+    return chunk
+
+def read_progress(directory: str):
+    path = os.path.join(directory, 'progress.txt')
+    if not os.path.exists(path):
+        return set()
+    with open(path, 'r') as file:
+        return set([int(line) for line in file if line.strip()])
+
+def prepare_sweep(model: Model, model_file: str, spec: dict, directory: str, chunk_size: int = DEFAULT_CHUNK_SIZE, dtype: str = 'float64'):
+    """
+    Creates the files of a sweep, or checks that an existing sweep directory was created for the same model file,
+    with the same contents, and the same specification, so that it can be resumed. Returns the sweep description.
+    """
+
+    check_spec(spec, model)
+    description = {'model_file': os.path.abspath(model_file), 'model_hash': hash_model_file(model_file), 'spec': spec, 'chunk_size': chunk_size, 'dtype': dtype, 'parameter_names': model.parameter_collection.get_names()}
+    description_path = os.path.join(directory, 'sweep.json')
+    if os.path.exists(description_path):
+        with open(description_path, 'r') as file:
+            previous_description = json.load(file)
+        assert previous_description.get('model_hash') == description['model_hash'], f'Sweep Error: the model file was modified since the sweep in {directory} was started. Use another output directory.'
+        assert previous_description == description, f'Sweep Error: {directory} holds a different sweep. Use another output directory.'
+        return description
+
+    os.makedirs(directory, exist_ok=True)
+    if os.path.exists(os.path.join(directory, 'progress.txt')):
+        os.remove(os.path.join(directory, 'progress.txt'))
+    no_rows = count_rows(spec)
+    output_shape = model.evaluate(aslist=False).shape
+
+    # parameter matrices are written chunk by chunk, like outputs
+    parameters = np.lib.format.open_memmap(os.path.join(directory, 'parameters.npy'), mode='w+', dtype='float64', shape=(no_rows, len(description['parameter_names'])))
+    for start in range(0, no_rows, chunk_size):
+        parameters[start:start + chunk_size] = build_parameters(model, spec, start, min(start + chunk_size, no_rows))
+    parameters.flush()
+    del parameters
+
+    outputs = np.lib.format.open_memmap(os.path.join(directory, 'outputs.npy'), mode='w+', dtype=dtype, shape=(no_rows,) + output_shape)
+    del outputs
+
+    # the description is written last, so directories of interrupted preparations are rebuilt
+    with open(description_path + '.tmp', 'w') as file:
+        json.dump(description, file, indent=2)
+    os.replace(description_path + '.tmp', description_path)
+    return description
+
+def run_sweep(model_file: str, spec: dict, directory: str, chunk_size: int = DEFAULT_CHUNK_SIZE, workers: int = None, dtype: str = 'float64', progress = None):
+    """
+    Runs a sweep, evaluating chunks of parameter vectors across worker processes, and skipping chunks completed
+    by previous runs. Completed chunks are recorded in progress.txt once their outputs are flushed to disk.
+
+    Parameters:
+        progress (Callable): Called with the numbers of completed and total chunks after every chunk.
+    """
+
+    model = exec_model_file(model_file)
+    prepare_sweep(model, model_file, spec, directory, chunk_size=chunk_size, dtype=dtype)
+
+    no_chunks = -(-count_rows(spec) // chunk_size)
+    completed = read_progress(directory)
+    remaining = [chunk for chunk in range(no_chunks) if chunk not in completed]
+    if progress:
+        progress(len(completed), no_chunks)
+
+    with ProcessPoolExecutor(workers) as executor, open(os.path.join(directory, 'progress.txt'), 'a') as progress_file:
+        # a bounded number of chunks is in flight, so huge sweeps are not submitted all at once
+        max_pending = 2 * (workers or os.cpu_count() or 1)
+        futures = set()
+        while remaining or futures:
+            while remaining and len(futures) < max_pending:
+                futures.add(executor.submit(_evaluate_chunk, model_file, directory, remaining.pop(0), chunk_size))
+            done, futures = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                progress_file.write(f'{future.result()}\n')
+                progress_file.flush()
+                os.fsync(progress_file.fileno())
+                completed.add(future.result())
+                if progress:
+                    progress(len(completed), no_chunks)
+
+    return os.path.join(directory, 'outputs.npy')
+
+def main():
+
+    # construct parser
+    parser = argparse.ArgumentParser(description='Evaluates a modelPlayground model over a parameter sweep.')
+    parser.add_argument('--model-file', type=str, help='Path to model file.', required=True)
+    parser.add_argument('--output', type=str, help='Directory of the sweep. Existing sweeps are resumed.', required=True)
+    parser.add_argument('--spec', type=str, default=None, help='Path to a JSON sweep specification. Overrides the options below.')
+    parser.add_argument('--method', type=str, choices=SWEEP_METHODS, default='grid', help='Grid or Latin hypercube sampling.')
+    parser.add_argument('--parameters', type=str, nargs='+', default=None, help='Swept parameters, as name or name=min:max. Defaults to all parameters over their bounds.')
+    parser.add_argument('--log', type=str, nargs='+', default=[], help='Parameters sampled on a log scale.')
+    parser.add_argument('--points', type=int, default=10, help='Number of grid points per parameter.')
+    parser.add_argument('--samples', type=int, default=1000, help='Number of Latin hypercube samples.')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for Latin hypercube sampling.')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='Number of parameter vectors per chunk.')
+    parser.add_argument('--workers', type=int, default=None, help='Number of worker processes. Defaults to the number of cores.')
+    parser.add_argument('--dtype', type=str, choices=('float32', 'float64'), default='float64', help='dtype of stored outputs.')
+    args = parser.parse_args()
+
+    try:
+        model = exec_model_file(args.model_file)
+    except ModelLoadError as error:
+        print(f'ERROR: {error}')
+        sys.exit(1)
+
+    def report(completed: int, total: int):
+        print(f'\r{completed}/{total} chunks', end='', flush=True)
+
+    try:
+        if args.spec:
+            with open(args.spec, 'r') as file:
+                spec = json.load(file)
+        else:
+            spec = build_spec(model, method=args.method, parameters=args.parameters, points=args.points, samples=args.samples, log=args.log, seed=args.seed)
+        path = run_sweep(args.model_file, spec, args.output, chunk_size=args.chunk_size, workers=args.workers, dtype=args.dtype, progress=report)
+    except AssertionError as error:
+        print(f'ERROR: {error}')
+        sys.exit(1)
+    print(f'\nWrote outputs to {path}')
+
+if __name__ == '__main__':
+    main()
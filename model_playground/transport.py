@@ -0,0 +1,72 @@
+import json
+import struct
+import numpy as np
+from .model import to_list
+
+BINARY_MIMETYPE = 'application/octet-stream'
+BINARY_DTYPES = ('float32', 'float64')
+ALIGNMENT = 8 # byte alignment of buffers, so that typed array views can be built on the client without copies
+
+def to_json(payload, convert = None):
+    """
+    Utility function that recursively converts np.ndarrays within a payload to lists, so that the
+    payload is JSON serializable. Lists already built for some arrays can be looked up with convert,
+    a function returning the list of an array, or None for arrays it has no list for.
+    """
+
+    if isinstance(payload, dict):
+        return dict([(key, to_json(value, convert)) for key, value in payload.items()])
+    elif isinstance(payload, (list, tuple)):
+        return [to_json(value, convert) for value in payload]
+    elif isinstance(payload, np.ndarray):
+        converted = convert(payload) if convert else None
+        return converted if converted is not None else to_list(payload)
+    elif isinstance(payload, np.generic):
+        return payload.item()
+    return payload
+
+def to_binary(payload, dtype: str = 'float64', convert = None):
+    """
+    Utility function that encodes a payload as a binary frame. np.ndarrays within the payload are
+    written as raw buffers and replaced by references of the form {'__buffer__': index} in a JSON
+    header. The frame layout is:
+
+        uint32 (little endian) header length | JSON header | padding | buffer | padding | buffer ...
+
+    The header has the form {'payload': ..., 'buffers': [{'dtype', 'shape'}, ...]}. Buffers start
+    at 8 byte aligned offsets, in the order they are listed in the header. Arrays already cast to
+    dtype can be looked up with convert, a function returning the cast array, or None for arrays it
+    has no cast array for.
+    """
+
+    assert dtype in BINARY_DTYPES, f'Transport Error: dtype must be one of {BINARY_DTYPES}.'
+
+    arrays, buffer_indices = [], {}
+    def replace_arrays(value):
+        if isinstance(value, dict):
+            return dict([(key, replace_arrays(item)) for key, item in value.items()])
+        elif isinstance(value, (list, tuple)):
+            return [replace_arrays(item) for item in value]
+        elif isinstance(value, np.ndarray):
+
+            # arrays shared between traces (e.g. independent variables) are only written once
+            if id(value) not in buffer_indices:
+                buffer_indices[id(value)] = len(arrays)
+                converted = convert(value) if convert else None
+                arrays.append(np.ascontiguousarray(converted if converted is not None else value, dtype=dtype))
+            return {'__buffer__': buffer_indices[id(value)]}
+        elif isinstance(value, np.generic):
+            return value.item()
+        return value
+
+    header = {'payload': replace_arrays(payload), 'buffers': [{'dtype': dtype, 'shape': list(array.shape)} for array in arrays]}
+    header = json.dumps(header, separators=(',', ':')).encode('utf-8')
+
+    chunks = [struct.pack('<I', len(header)), header, b'\0' * (_pad(4 + len(header)) - 4 - len(header))]
+    for array in arrays:
+        chunks.append(memoryview(array).cast('B'))
+        chunks.append(b'\0' * (_pad(array.nbytes) - array.nbytes))
+    return b''.join(chunks)
+
+def _pad(nbytes: int):
+    return -(-nbytes // ALIGNMENT) * ALIGNMENT
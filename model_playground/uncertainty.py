@@ -0,0 +1,186 @@
+import numpy as np
+from concurrent.futures import FIRST_COMPLETED, wait
+from .model import Model
+from .pool import get_worker_model
+
+DEFAULT_LEVEL = 0.95 # probability mass between the lower and upper edges of bands
+DEFAULT_BINS = 256 # histogram bins per point
+RANGE_MARGIN = 0.25 # histogram ranges extend beyond the values of the first chunk by this fraction of their span
+
+class PercentileAccumulator:
+    def __init__(self, percentiles: tuple, bins: int = DEFAULT_BINS):
+        """
+        Estimates percentiles of many values per point from a stream of chunks, keeping a histogram per point rather
+        than the values themselves. Histogram ranges are set by the first chunk; later values outside them fall into
+        the edge bins, whose outer edges track the exact minimum and maximum. Percentiles are interpolated linearly
+        within bins. Non-finite values are ignored.
+
+        Parameters:
+            percentiles (tuple): Percentiles to estimate, between 0 and 100.
+            bins (int): Number of histogram bins per point.
+        """
+
+        assert bins > 0, 'Uncertainty Error: bins must be a positive integer.'
+        assert all(0 <= percentile <= 100 for percentile in percentiles), 'Uncertainty Error: percentiles must be between 0 and 100.'
+
+        self.percentiles = tuple(percentiles)
+        self.bins = bins
+        self.count = 0
+        self.shape = None
+        self._counts = None
+
+    def update(self, values: np.ndarray):
+        """
+        Adds a chunk of values with shape (number of samples, ...), where trailing axes index points.
+        """
+
+        values = np.asarray(values, dtype=float)
+        self.shape = values.shape[1:]
+        values = values.reshape(len(values), -1)
+        finite = np.isfinite(values)
+
+        if self._counts is None:
+            with np.errstate(all='ignore'):
+                lower, upper = np.nanmin(np.where(finite, values, np.nan), axis=0), np.nanmax(np.where(finite, values, np.nan), axis=0)
+            lower, upper = np.nan_to_num(lower), np.nan_to_num(upper)
+            margin = RANGE_MARGIN * (upper - lower)
+            self._lower, self._upper = lower - margin, upper + margin
+            self._scale = np.divide(self.bins, self._upper - self._lower, out=np.zeros_like(self._lower), where=self._upper > self._lower)
+            self._minimum, self._maximum = np.full_like(lower, np.inf), np.full_like(lower, -np.inf)
+            self._counts = np.zeros(values.shape[1] * self.bins, dtype=np.int64)
+
+        # values of every point are counted at once, in bins offset by the index of their point
+        with np.errstate(invalid='ignore'):
+            bin_indices = np.clip(np.floor((values - self._lower) * self._scale), 0, self.bins - 1)
+        bin_indices = (np.where(finite, bin_indices, 0).astype(np.int64) + np.arange(values.shape[1]) * self.bins)[finite]
+        self._counts += np.bincount(bin_indices, minlength=len(self._counts))
+        self._minimum = np.fmin(self._minimum, np.min(np.where(finite, values, np.inf), axis=0))
+        self._maximum = np.fmax(self._maximum, np.max(np.where(finite, values, -np.inf), axis=0))
+        self.count += len(values)
+
+    def get_percentiles(self):
+        """
+        Returns estimated percentiles with shape (number of percentiles, ...), where trailing axes index points.
+        Points without finite values are NaN.
+        """
+
+        assert self._counts is not None, 'Uncertainty Error: no values have been added.'
+
+        counts = self._counts.reshape(-1, self.bins)
+        cumulative_counts = np.cumsum(counts, axis=1)
+        totals = cumulative_counts[:, -1]
+        edges = self._lower[:, np.newaxis] + (self._upper - self._lower)[:, np.newaxis] * np.linspace(0, 1, self.bins + 1)
+        with np.errstate(invalid='ignore'):
+            edges = np.clip(edges, self._minimum[:, np.newaxis], self._maximum[:, np.newaxis])
+        edges[:, 0], edges[:, -1] = self._minimum, self._maximum
+        rows = np.arange(len(counts))
+
+        estimates = []
+        for percentile in self.percentiles:
+            target = percentile / 100 * totals
+            bin_indices = np.minimum(np.sum(cumulative_counts < target[:, np.newaxis], axis=1), self.bins - 1)
+            previous_counts = cumulative_counts[rows, bin_indices] - counts[rows, bin_indices]
+            with np.errstate(all='ignore'):
+                fraction = np.clip(np.nan_to_num((target - previous_counts) / counts[rows, bin_indices]), 0, 1)
+                estimate = edges[rows, bin_indices] + fraction * (edges[rows, bin_indices + 1] - edges[rows, bin_indices])
+            estimates.append(np.where(totals > 0, estimate, np.nan))
+
+        return np.array(estimates).reshape((len(self.percentiles),) + self.shape)
+
+def sample_parameters(model: Model, parameters: dict, no_samples: int, rng: np.random.Generator):
+    """
+    Draws parameter vectors around parameters, following the uncertainties of the parameter collection (see
+    ParameterCollection), and clipped to the parameter bounds. Returns an np.ndarray with shape (no_samples, number of parameters).
+    """
+
+    collection = model.parameter_collection
+    values = np.array([float(parameters[name]) for name in collection.get_names()])
+    samples = np.tile(values, (no_samples, 1))
+    for index, uncertainty in enumerate(collection.get_uncertainties()):
+        if not uncertainty:
+            continue
+        distribution, scale = uncertainty if isinstance(uncertainty, (tuple, list)) else ('uniform', uncertainty)
+        if distribution == 'uniform':
+            samples[:, index] += scale * rng.uniform(-1, 1, no_samples)
+        elif distribution == 'normal':
+            samples[:, index] += scale * rng.standard_normal(no_samples)
+        else:
+            samples[:, index] *= np.exp(scale * rng.standard_normal(no_samples))
+
+    return np.clip(samples, collection.get_lower_bounds(), collection.get_upper_bounds())
+
+def _evaluate_batch_model_file(model_file: str, param_matrix: np.ndarray):
+    return get_worker_model(model_file).evaluate_batch(param_matrix)
+
+def propagate_uncertainty(
+        model: Model,
+        parameters: dict = None,
+        samples: int = 2000,
+        chunk_size: int = 256,
+        level: float = DEFAULT_LEVEL,
+        seed: int = 0,
+        executor = None,
+        model_file: str = None,
+        progress = None,
+        stop = None):
+    """
+    Propagates parameter uncertainties to model predictions by Monte Carlo sampling. Samples are evaluated chunk_size
+    at a time with evaluate_batch, and reduced into percentile bands as they complete, so outputs of all samples are
+    never held at once. Chunks run concurrently in an executor if one is given: process pools read the model from
+    model_file, thread pools share the model.
+
+    Parameters:
+        parameters (dict): Centers of the parameter distributions. Defaults to the set parameters of the model.
+        level (float): Probability mass within bands, e.g. 0.95 for bands from the 2.5th to the 97.5th percentile.
+        progress (Callable): Called with the bands so far after every chunk.
+        stop (threading.Event): Stops sampling early when set.
+
+    Returns a result of the form {'samples', 'percentiles', 'bands'}, where bands has shape (2, number of predictions, ...).
+    """
+
+    assert samples > 0 and chunk_size > 0, 'Uncertainty Error: samples and chunk_size must be positive.'
+    assert 0 < level < 1, 'Uncertainty Error: level must be between 0 and 1.'
+
+    parameters = dict(model.get_parameters(), **(parameters or {}))
+    param_matrix = sample_parameters(model, parameters, samples, np.random.default_rng(seed))
+    chunks = [param_matrix[start:start + chunk_size] for start in range(0, samples, chunk_size)]
+    accumulator = PercentileAccumulator((50 * (1 - level), 50 * (1 + level)))
+
+    def reduce(output):
+        with np.errstate(all='ignore'):
+            accumulator.update(output)
+        result = {'samples': accumulator.count, 'percentiles': accumulator.percentiles, 'bands': accumulator.get_percentiles()}
+        if progress:
+            progress(result)
+        return result
+
+    result = None
+    if executor is None:
+        for chunk in chunks:
+            if stop is not None and stop.is_set():
+                break
+            result = reduce(model.evaluate_batch(chunk, chunk_size=chunk_size))
+        return result
+
+    # a bounded number of chunks is in flight, so that outputs waiting to be reduced stay within memory
+    max_pending = getattr(executor, '_max_workers', 1) + 1
+    def submit(chunk):
+        if model_file:
+            return executor.submit(_evaluate_batch_model_file, model_file, chunk)
+        return executor.submit(model.evaluate_batch, chunk, chunk_size)
+
+    pending, futures = list(chunks), set()
+    try:
+        while pending or futures:
+            while pending and len(futures) < max_pending and not (stop is not None and stop.is_set()):
+                futures.add(submit(pending.pop(0)))
+            if not futures:
+                break
+            done, futures = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                result = reduce(future.result())
+    finally:
+        for future in futures:
+            future.cancel()
+
+    return result
@@ -3,32 +3,89 @@
 import os
 import sys
 import argparse
-from flask import Flask
-from model_playground.routes import template
+from model_playground.routes import create_app, load_model, SURFACE_TYPES
+from model_playground.registry import ModelLoadError
+from model_playground.server import run_workers
+from model_playground.pool import POOL_KINDS, DEFAULT_EVALUATION_TIMEOUT
+from model_playground.downsample import DOWNSAMPLING_METHODS
 
-app = Flask(__name__, static_url_path='/static', template_folder='./templates')
-app.config['model_file'], app.config['model'], app.config['plot_data'] = None, None, {}
-
-# register route handling functions
-app.register_blueprint(template)
+app = create_app()
 
 if __name__ == '__main__':
 
     # construct parser
     parser = argparse.ArgumentParser(description='Runs a modelPlayground local server.')
-    parser.add_argument('--model-file', type=str, help='Path to model file.', required=True)
+    model_source = parser.add_mutually_exclusive_group(required=True)
+    model_source.add_argument('--model-file', type=str, help='Path to model file.')
+    model_source.add_argument('--model-dir', type=str, help='Directory of model files, each served under /<file name>/.')
+    parser.add_argument('--pool', type=str, choices=POOL_KINDS, default='process', help='Kind of pool that runs model evaluations. Worker processes that time out are terminated, while threads keep running until their evaluation finishes.')
+    parser.add_argument('--pool-size', type=int, default=None, help='Number of workers in the evaluation pool.')
+    parser.add_argument('--evaluation-timeout', type=float, default=DEFAULT_EVALUATION_TIMEOUT, help='Seconds to wait for an evaluation before returning the last good traces.')
+    parser.add_argument('--fit-pool', type=str, choices=POOL_KINDS, default='process', help='Kind of pool that runs multi-start fits.')
+    parser.add_argument('--fit-pool-size', type=int, default=None, help='Number of workers in the fitting pool.')
+    parser.add_argument('--disk-cache', type=str, default=None, help='Directory of a persistent cache of model outputs, shared across restarts and worker processes.')
+    parser.add_argument('--disk-cache-bytes', type=int, default=None, help='Maximum size of the disk cache in bytes.')
+    parser.add_argument('--prewarm', action='store_true', help='Fill the disk cache with outputs at every slider position before serving.')
+    parser.add_argument('--band-samples', type=int, default=None, help='Number of samples of final estimates of uncertainty bands.')
+    parser.add_argument('--max-points', type=int, default=None, help='Default number of points per trace sent to clients.')
+    parser.add_argument('--downsample', type=str, choices=DOWNSAMPLING_METHODS.keys(), default='lttb', help='Method for downsampling traces.')
+    parser.add_argument('--surface-type', type=str, choices=SURFACE_TYPES, default='surface', help='Plot type of models of two independent variables.')
+    parser.add_argument('--workers', type=int, default=1, help='Number of server worker processes.')
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='Hostname to listen on.')
+    parser.add_argument('--port', type=int, default=5000, help='Port to listen on.')
 
     # access arguments
     args = parser.parse_args()
-    app.config['model_file'] = args.model_file
-
-    # ensure model file exists
-    if not app.config['model_file']: 
-        print('ERROR: A model file is required to run the local server.')
+    if args.prewarm and not args.disk_cache:
+        print('ERROR: --prewarm requires --disk-cache.')
         sys.exit()
 
-    elif not os.path.exists(app.config['model_file']):
-        print('ERROR: Model file not found.')
+    if args.model_dir:
+
+        # ensure model directory exists
+        if not os.path.isdir(args.model_dir):
+            print('ERROR: Model directory not found.')
+            sys.exit()
+
+        app = create_app(model_directory=args.model_dir)
+
+    else:
+        app.config['model_file'] = args.model_file
+
+        # ensure model file exists
+        if not os.path.exists(app.config['model_file']):
+            print('ERROR: Model file not found.')
+            sys.exit()
+
+    app.config['max_points'], app.config['downsample'] = args.max_points, args.downsample
+    app.config['surface_type'] = args.surface_type
+    app.config['fit_pool_options'] = {'kind': args.fit_pool, 'max_workers': args.fit_pool_size}
+    app.config['uncertainty_options'] = {'samples': args.band_samples} if args.band_samples else {}
+    app.config['disk_cache_options'] = {'directory': args.disk_cache, 'max_bytes': args.disk_cache_bytes} if args.disk_cache else {}
+    app.config['evaluation_pool_options'] = {'max_workers': args.pool_size, 'kind': args.pool, 'timeout': args.evaluation_timeout, 'model_file': os.path.abspath(args.model_file) if args.model_file else None}
+
+    # update streams are held in memory, so clients of multiple workers fall back to plain requests
+    app.config['streaming'] = args.workers == 1
+
+    # read models into memory before forking worker processes; a single process serves requests while a registry loads
+    try:
+        if args.model_dir:
+            app.config['registry'].load_all(background=args.workers == 1)
+        else:
+            app.config['model'] = load_model(app.config['model_file'])
+    except ModelLoadError as error:
+        print(f'ERROR: {error}')
         sys.exit()
 
-    app.run()
\ No newline at end of file
+    # prewarming waits for models to load, and finishes before worker processes are forked
+    if args.prewarm:
+        models = [app.config['model']] if args.model_file else []
+        if args.model_dir:
+            app.config['registry'].load_all(background=False)
+            models = [entry.model for entry in app.config['registry'].entries.values() if entry.model]
+        for model in models:
+            if not model.disk_cache:
+                model.enable_disk_cache(**app.config['disk_cache_options'])
+            print(f' * Prewarmed {model.prewarm_disk_cache()} outputs of {model.name}')
+
+    run_workers(app, host=args.host, port=args.port, workers=args.workers)
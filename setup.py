@@ -18,7 +18,8 @@ setup(
     ],
     entry_points={
         'console_scripts': [
-            'run_app=modelPlayground.run_app:main'
+            'run_app=modelPlayground.run_app:main',
+            'model_playground_sweep=model_playground.sweep:main'
         ],
     },
     install_requires=requirements,
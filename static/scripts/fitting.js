@@ -0,0 +1,122 @@
+// Uploaded measurements, and the indices of the plot traces showing them
+const fitState = {
+    data: null,
+    traceIndices: [],
+    running: false,
+};
+
+async function uploadData(file) {
+    /**
+     * Sends a CSV or JSON file of measurements to the server, which reads it for the current model,
+     * and overlays the measurements on the plot.
+     */
+
+    const formData = new FormData();
+    formData.append('file', file);
+    const response = await fetch('upload_data', { method: 'POST', body: formData });
+    const data = await response.json();
+    if (!response.ok) {
+        throw new Error(data['error']);
+    }
+    fitState.data = data;
+
+    // Replace measurements of a previous upload
+    const plotDiv = document.getElementById('plot-container');
+    if (fitState.traceIndices.length > 0) {
+        Plotly.deleteTraces(plotDiv, fitState.traceIndices);
+    }
+    const traces = data['y'].map((y, index) => ({
+        type: 'scatter',
+        mode: 'markers',
+        x: data['x'],
+        y: y,
+        name: `data (${data['predictions'][index]})`,
+    }));
+    const firstIndex = plotDiv.data.length;
+    fitState.traceIndices = traces.map((_, index) => firstIndex + index);
+    Plotly.addTraces(plotDiv, traces);
+}
+
+function applyFitParameters(parameters) {
+    Object.entries(parameters).forEach(([name, value]) => {
+        setSliderValue(document.getElementById(`${name}-slider`), valueLabels[name], value);
+    });
+    submitParameters();
+}
+
+async function fitParameters() {
+    /**
+     * Fits the model to the uploaded measurements. The server streams the best parameters found so far
+     * as server-sent events, which move the sliders as the fit progresses.
+     */
+
+    const status = document.getElementById('fit-status');
+    fitState.running = true;
+    status.innerHTML = 'Fitting...';
+
+    const response = await fetch('fit_parameters', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({ data: fitState.data }),
+    });
+    if (!response.ok) {
+        status.innerHTML = (await response.json())['error'];
+        fitState.running = false;
+        return;
+    }
+
+    // Events are separated by blank lines, and may be split across chunks
+    const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+    let buffered = '';
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) {
+            break;
+        }
+        buffered += value;
+        const events = buffered.split('\n\n');
+        buffered = events.pop();
+        events.forEach(event => {
+            const line = event.split('\n').find(item => item.startsWith('data: '));
+            if (line === undefined) {
+                return;
+            }
+            const result = JSON.parse(line.slice('data: '.length));
+            if (result['error'] !== undefined) {
+                status.innerHTML = `Fit failed: ${result['error']}`;
+                return;
+            }
+            applyFitParameters(result['parameters']);
+            const cost = result['cost'] === null ? 'not finite' : formatNumber(result['cost'], 3);
+            status.innerHTML = `${result['done'] ? 'Done' : 'Fitting'}: cost ${cost} after ${result['iterations']} iterations`;
+        });
+    }
+    fitState.running = false;
+}
+
+function initFitting() {
+    const fileInput = document.getElementById('data-file');
+    const fitButton = document.getElementById('fit-button');
+    const status = document.getElementById('fit-status');
+
+    fileInput.addEventListener('change', async () => {
+        if (fileInput.files.length === 0) {
+            return;
+        }
+        try {
+            await uploadData(fileInput.files[0]);
+            fitButton.disabled = false;
+            status.innerHTML = '';
+        } catch (error) {
+            status.innerHTML = error.message;
+        }
+    });
+
+    fitButton.addEventListener('click', () => {
+        if (!fitState.running && fitState.data !== null) {
+            fitParameters();
+        }
+    });
+}
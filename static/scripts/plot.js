@@ -1,10 +1,101 @@
+const BINARY_DTYPE = 'float32';
+
+// Level of detail of traces: the server downsamples traces to a budget of points per pixel,
+// and sends full resolution data for the visible range when zooming in
+const plotView = {
+    xRange: null,
+    pointsPerPixel: 2,
+};
+
+// Sensitivities of predictions to parameters are refetched once slider updates settle
+const sensitivityView = {
+    enabled: false,
+    method: 'central',
+};
+
+// Uncertainty bands are refined by a stream of estimates from growing numbers of samples,
+// restarted once slider updates settle
+const bandView = {
+    source: null,
+};
+
+function pointBudget() {
+    const plotDiv = document.getElementById('plot-container');
+    return Math.max(Math.ceil(plotDiv.clientWidth * plotView.pointsPerPixel), 100);
+}
+
+function applyTraceUpdates(traces) {
+    /**
+     * Patches traces in place. Downsampled traces carry their own x values, and surfaces only carry z values.
+     */
+
+    if (traces.length === 0) {
+        return;
+    }
+    refreshSensitivity();
+    refreshBands();
+    if (traces[0].z !== undefined) {
+        Plotly.restyle('plot-container', { z: traces.map(item => item.z) }, traces.map(item => item.index));
+        return;
+    }
+    const update = { y: traces.map(item => item.y) };
+    if (traces.every(item => item.x !== undefined)) {
+        update.x = traces.map(item => item.x);
+    }
+    Plotly.restyle('plot-container', update, traces.map(item => item.index));
+}
+
+function decodeBinaryPayload(buffer) {
+    /**
+     * Decodes a binary frame (see model_playground.transport.to_binary) into a payload.
+     * Buffers are exposed as typed array views on the frame, without copies.
+     *
+     * @param {ArrayBuffer} buffer - The binary frame.
+     * @returns The decoded payload.
+     */
+
+    const align = (nbytes) => Math.ceil(nbytes / 8) * 8;
+    const headerLength = new DataView(buffer).getUint32(0, true);
+    const header = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, 4, headerLength)));
+
+    // Build typed array views, in the order the buffers were written
+    let offset = align(4 + headerLength);
+    const arrays = header['buffers'].map(({ dtype, shape }) => {
+        const TypedArray = dtype === 'float32' ? Float32Array : Float64Array;
+        const length = shape.reduce((a, b) => a * b, 1);
+        const array = new TypedArray(buffer, offset, length);
+        offset += align(length * TypedArray.BYTES_PER_ELEMENT);
+
+        // Multidimensional buffers are exposed as arrays of row views
+        if (shape.length > 1) {
+            const rowLength = length / shape[0];
+            return Array.from({ length: shape[0] }, (_, i) => array.subarray(i * rowLength, (i + 1) * rowLength));
+        }
+        return array;
+    });
+
+    const replaceBuffers = (value) => {
+        if (Array.isArray(value)) {
+            return value.map(replaceBuffers);
+        } else if (value !== null && typeof value === 'object') {
+            if ('__buffer__' in value) {
+                return arrays[value['__buffer__']];
+            }
+            return Object.fromEntries(Object.entries(value).map(([key, item]) => [key, replaceBuffers(item)]));
+        }
+        return value;
+    };
+
+    return replaceBuffers(header['payload']);
+}
+
 async function fetchPlotData() {
     try {
-        const response = await fetch('/serve_plot_data');
+        const response = await fetch(`serve_plot_data?format=binary&dtype=${BINARY_DTYPE}&max_points=${pointBudget()}`);
         if (!response.ok) {
             throw new Error('Network response was not ok');
         }
-        const plotData = await response.json();
+        const plotData = decodeBinaryPayload(await response.arrayBuffer());
         return plotData;
     } catch (error) {
         console.error('Error fetching slider data:', error);
@@ -16,6 +107,145 @@ async function initPlot() {
 
     const plotData = await fetchPlotData();
 
+    // Updates of this page are versioned after the last update of the session
+    parameterStream.sequence = parameterStream.lastApplied = parameterStream.displayed = plotData['version'];
+    parameterStream.modelVersion = plotData['model_version'];
+
     Plotly.newPlot('plot-container', plotData['traces'], plotData['layout']);
+    refreshBands();
+
+    // Surfaces are sent at full resolution, so only line traces are refetched when zooming
+    if (plotData['traces'].some(item => item.z !== undefined)) {
+        return;
+    }
+
+    // Fetch data for the visible range when zooming or panning
+    const plotDiv = document.getElementById('plot-container');
+    plotDiv.on('plotly_relayout', async (event) => {
+        if ('xaxis.range[0]' in event) {
+            plotView.xRange = [event['xaxis.range[0]'], event['xaxis.range[1]']];
+        } else if ('xaxis.autorange' in event) {
+            plotView.xRange = null;
+        } else {
+            return;
+        }
+
+        const range = plotView.xRange ? `&xmin=${plotView.xRange[0]}&xmax=${plotView.xRange[1]}` : '';
+        const response = await fetch(`serve_range_data?format=binary&dtype=${BINARY_DTYPE}&max_points=${pointBudget()}${range}&model_version=${parameterStream.modelVersion}`);
+        const data = decodeBinaryPayload(await response.arrayBuffer());
+        if (data['status'] === 'reload') {
+            reloadPlot();
+            return;
+        }
+        applyTraceUpdates(data['traces']);
+    });
+
+}
 
-}
\ No newline at end of file
+async function reloadPlot() {
+    /**
+     * Replaces every trace and the layout once the server reloaded the model, since the number and
+     * shape of traces may have changed.
+     */
+
+    const plotData = await fetchPlotData();
+    if (plotData === null) {
+        return;
+    }
+    parameterStream.sequence = Math.max(parameterStream.sequence, plotData['version']);
+    parameterStream.lastApplied = parameterStream.displayed = plotData['version'];
+    parameterStream.modelVersion = plotData['model_version'];
+    plotView.xRange = null;
+
+    Plotly.react('plot-container', plotData['traces'], plotData['layout']);
+    refreshBands();
+}
+
+const refreshBands = _.debounce(() => {
+    /**
+     * Streams uncertainty bands for the current parameters, replacing the edges of band traces as estimates improve.
+     * A newer stream replaces one still running.
+     */
+
+    const plotDiv = document.getElementById('plot-container');
+    const bandIndices = plotDiv.data
+        .map((trace, index) => (trace.meta && trace.meta.band ? index : null))
+        .filter(index => index !== null);
+    if (bandIndices.length === 0) {
+        return;
+    }
+    if (bandView.source !== null) {
+        bandView.source.close();
+    }
+
+    const range = plotView.xRange ? `&xmin=${plotView.xRange[0]}&xmax=${plotView.xRange[1]}` : '';
+    const source = new EventSource(`stream_bands?dtype=${BINARY_DTYPE}&max_points=${pointBudget()}${range}`);
+    source.onmessage = (event) => {
+        const bytes = Uint8Array.from(atob(event.data), c => c.charCodeAt(0));
+        const { traces, done, error } = decodeBinaryPayload(bytes.buffer);
+        if (error !== undefined) {
+            console.error('Error estimating uncertainty bands:', error);
+        } else if (traces.length === bandIndices.length) {
+            Plotly.restyle('plot-container', { x: traces.map(item => item.x), y: traces.map(item => item.y) }, bandIndices);
+        }
+        if (done) {
+            source.close();
+        }
+    };
+
+    // Streams end once sampling is done, so they are not reconnected
+    source.onerror = () => source.close();
+    bandView.source = source;
+}, 250);
+
+async function fetchSensitivityData() {
+    try {
+        const response = await fetch(`serve_sensitivity_data?method=${sensitivityView.method}&format=binary&dtype=${BINARY_DTYPE}`);
+        if (!response.ok) {
+            throw new Error('Network response was not ok');
+        }
+        return decodeBinaryPayload(await response.arrayBuffer());
+    } catch (error) {
+        console.error('Error fetching sensitivity data:', error);
+        return null;
+    }
+}
+
+const refreshSensitivity = _.debounce(async () => {
+    /**
+     * Renders the sensitivity matrix as a heatmap, with a row per prediction and a column per parameter.
+     */
+
+    if (!sensitivityView.enabled) {
+        return;
+    }
+    const sensitivityData = await fetchSensitivityData();
+    if (sensitivityData === null) {
+        return;
+    }
+
+    const trace = {
+        type: 'heatmap',
+        x: sensitivityData['parameters'],
+        y: sensitivityData['predictions'],
+        z: sensitivityData['matrix'],
+        colorscale: 'Viridis',
+    };
+    const layout = {
+        title: 'Change of predictions across slider ranges (RMS)',
+        xaxis: { title: 'parameter' },
+    };
+    Plotly.react('sensitivity-container', [trace], layout);
+}, 250);
+
+function initSensitivity() {
+    const toggle = document.getElementById('sensitivity-toggle');
+    toggle.addEventListener('change', () => {
+        sensitivityView.enabled = toggle.checked;
+        if (sensitivityView.enabled) {
+            refreshSensitivity();
+        } else {
+            Plotly.purge('sensitivity-container');
+        }
+    });
+}
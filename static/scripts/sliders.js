@@ -13,9 +13,173 @@ function formatNumber(number, noDecimals) {
     return `${coefficient}e${exponent}`;
 }
 
+const parameterStream = {
+    clientId: crypto.randomUUID(),
+    channelId: null,
+    sequence: 0,
+    lastApplied: 0,
+    // Version whose traces are displayed, which the server diffs updates against
+    displayed: 0,
+    // Version of the model on the server, which changes when the server reloads the model
+    modelVersion: null,
+    // Plain requests are sent one at a time; changes made meanwhile are sent once the pending one completes
+    inFlight: false,
+    queued: false,
+};
+
+// Value labels of sliders, by parameter name
+const valueLabels = {};
+
+function getSliderValue(slider) {
+    /**
+     * Reads the parameter value of a slider, undoing the log transform if applicable.
+     */
+
+    if (slider.classList.contains('log')) {
+        return Math.pow(10, parseFloat(slider.value));
+    }
+    return parseFloat(slider.value);
+}
+
+function setSliderValue(slider, valueLabel, value) {
+    if (slider.classList.contains('log')) {
+        slider.value = Math.log10(value).toString();
+    } else {
+        slider.value = value.toString();
+    }
+    valueLabel.innerHTML = formatNumber(value, 2);
+}
+
+function collectParameters() {
+    const parameters = {};
+    document.querySelectorAll('#sliders .slider').forEach(slider => {
+        parameters[slider.dataset.name] = getSliderValue(slider);
+    });
+    return parameters;
+}
+
+function openParameterStream() {
+    /**
+     * Opens a persistent update stream. Frames carry the sequence number of the parameter
+     * vector they were evaluated for, so frames older than the last applied one are dropped.
+     */
+
+    parameterStream.channelId = crypto.randomUUID();
+    const source = new EventSource(`stream_plot_data?channel=${parameterStream.channelId}&dtype=${BINARY_DTYPE}`);
+
+    source.onmessage = (event) => {
+        const bytes = Uint8Array.from(atob(event.data), c => c.charCodeAt(0));
+        const { sequence, traces, status } = decodeBinaryPayload(bytes.buffer);
+        if (sequence <= parameterStream.lastApplied) {
+            return;
+        }
+        parameterStream.lastApplied = sequence;
+        if (status === 'reload') {
+            reloadPlot();
+            return;
+        }
+
+        // Failed, timed out or refused evaluations leave the last good traces in place
+        if (status === 'timeout' || status === 'error' || status === 'busy') {
+            console.warn(`Evaluation ${sequence} did not complete (${status}).`);
+        }
+
+        // Only traces that changed are sent, so patch them in place
+        applyTraceUpdates(traces);
+    };
+    source.onerror = (error) => {
+        console.error('Error on update stream:', error);
+    };
+}
+
+function submitParameters() {
+    if (!STREAMING) {
+        // Only the newest parameters are sent once the pending request completes
+        if (parameterStream.inFlight) {
+            parameterStream.queued = true;
+            return;
+        }
+        parameterStream.sequence += 1;
+        requestPlotUpdate(parameterStream.sequence);
+        return;
+    }
+
+    parameterStream.sequence += 1;
+    fetch('submit_parameters', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({
+            channel: parameterStream.channelId,
+            sequence: parameterStream.sequence,
+            modelVersion: parameterStream.modelVersion,
+            parameters: collectParameters(),
+            maxPoints: pointBudget(),
+            xRange: plotView.xRange
+        })
+    }).catch(error => console.error('Error submitting parameters:', error));
+}
+
+async function requestPlotUpdate(version) {
+    /**
+     * Fallback for servers without update streams. The whole parameter vector is applied
+     * in a single evaluation, and only traces that differ from the displayed version are sent.
+     * Requests are sent one at a time, so that the displayed version cannot change while one is pending.
+     */
+
+    const requestOptions = {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({
+            parameters: collectParameters(),
+            version: version,
+            client: parameterStream.clientId,
+            baseVersion: parameterStream.displayed,
+            modelVersion: parameterStream.modelVersion,
+            format: 'binary',
+            dtype: BINARY_DTYPE,
+            maxPoints: pointBudget(),
+            xRange: plotView.xRange
+        })
+    }
+
+    parameterStream.inFlight = true;
+    try {
+        const response = await fetch('update_parameters', requestOptions);
+        const data = decodeBinaryPayload(await response.arrayBuffer());
+        if (data['status'] === 'stale') {
+            // Another page of the session got ahead, so the parameters are sent again with a newer version
+            parameterStream.sequence = Math.max(parameterStream.sequence, data['latest_version']);
+            parameterStream.queued = true;
+        } else if (data['status'] === 'reload') {
+            reloadPlot();
+        } else if (data['version'] > parameterStream.lastApplied) {
+            parameterStream.lastApplied = data['version'];
+            if (data['status'] === 'ok') {
+                parameterStream.displayed = data['version'];
+            } else {
+                console.warn(`Evaluation ${data['version']} did not complete (${data['status']}).`);
+            }
+            applyTraceUpdates(data['traces']);
+        }
+    } catch (error) {
+        console.error('Error updating parameters:', error);
+    } finally {
+        parameterStream.inFlight = false;
+    }
+
+    if (parameterStream.queued) {
+        parameterStream.queued = false;
+        submitParameters();
+    }
+}
+
 async function fetchSliderData() {
     try {
-        const response = await fetch('/serve_slider_data');
+        const response = await fetch('serve_slider_data');
         if (!response.ok) {
             throw new Error('Network response was not ok');
         }
@@ -47,6 +211,7 @@ function createSlider(sliderData) {
     // Create the slider
     const slider = document.createElement('input');
     slider.id = `${name}-slider`;
+    slider.dataset.name = name;
     slider.classList.add('slider', scale);
     slider.type = 'range';
 
@@ -65,54 +230,14 @@ function createSlider(sliderData) {
 
     setSliderAttributes();
 
-    const plotDiv = document.getElementById('plot-container');
-    const handleInputEvent = _.debounce(async function() {
-
-            // Get current plot data
-            const currentPlotData = plotDiv.data;
-            const visbility = currentPlotData.map(item => {
-                let visibility = item.visible
-                return visibility;
-            })
+    const handleInputEvent = function() {
 
             // Transform value, if applicable
-            let value;
-            if (slider.classList.contains('log')) {
-                value = Math.pow(10, parseFloat(slider.value));
-            } else {
-                value = parseFloat(slider.value);
-            }
-            valueLabel.innerHTML = formatNumber(value, 2);
-    
-            const paramName = slider.id.split('-')[0];
-            const paramValue = value;
-            
-            const requestOptions = {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                },
-                body: JSON.stringify({ paramName: paramName, paramValue: paramValue })
-            }
-            
-            await fetch('/update_plot_data', requestOptions)
-            .then(response => { return response.json() })
-            .then(data => { 
-                const traces = data['traces'];
-                const updatedTraces = []
-                for (let i = 0; i < traces.length; i++) {
-                    const item = traces[i];
-                    const isVisible = visbility[i];
-
-                    if (typeof isVisible == 'string') {
-                        item.visible = isVisible
-                    }
-                    updatedTraces.push(item);
-                }
-
-                Plotly.react('plot-container', updatedTraces, data['layout'])
-            });
-    }, 300)
+            valueLabel.innerHTML = formatNumber(getSliderValue(slider), 2);
+
+            // Every change is streamed; the server only evaluates the newest parameter vector
+            submitParameters();
+    }
 
     slider.addEventListener('input', handleInputEvent);
 
@@ -215,6 +340,7 @@ function createSettingsMenu(sliderData, slider, valueLabel) {
         }
 
         settingsMenu.style.display = 'none';
+        submitParameters();
 
     });
 
@@ -229,6 +355,9 @@ async function initSliders() {
     */
 
     const sliderDatas = await fetchSliderData();
+    if (STREAMING) {
+        openParameterStream();
+    }
 
     // Collect all necessary containers
     const nameLabelsContainer = document.getElementById('name-labels');
@@ -241,6 +370,7 @@ async function initSliders() {
 
         // Create slider and corresponding dashboard panel
         const {slider, nameLabel, valueLabel} = createSlider(sliderData);
+        valueLabels[sliderData.name] = valueLabel;
 
         // Create the settings menu
         const settingsMenu = createSettingsMenu(sliderData, slider, valueLabel);
@@ -274,4 +404,12 @@ async function initSliders() {
 
     })
 
+    // Reset all parameters at once, in a single update
+    document.getElementById('reset-button').addEventListener('click', () => {
+        sliderDatas.forEach(({ name, default_value }) => {
+            setSliderValue(document.getElementById(`${name}-slider`), valueLabels[name], default_value);
+        });
+        submitParameters();
+    });
+
 }
\ No newline at end of file